@@ -1,9 +1,9 @@
 import asyncio
-import json
 import re
 from datetime import datetime
 from uuid import uuid4
 
+import orjson
 from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict
@@ -11,20 +11,130 @@ from pydantic import BaseModel, ConfigDict
 from app.utils import (
     call_llm_stream, 
     is_sse, 
-    ROOT_DIR, 
-    States
+    make_prompt_cache_key,
+    parse_tool_arguments,
+    render_system_prompt, 
+    States,
+    TokenBatcher
 )
 from app.stores.session_store import SessionStore
-from app.stores.chat_history import ChatHistoryStore
+from app.stores.chat_history import history_store
 from app.tools import get_tool_map, get_tools_for_llm
 from app.logger import get_logger
 from app.langgraph_agent import LangGraphSearchAgent
 
 router = APIRouter()
 store = SessionStore()
-history_store = ChatHistoryStore()
 log = get_logger(__name__)
 
+DATA_PREFIX = b"data: "
+FRAME_SUFFIX = b"\n\n"
+KEEP_ALIVE = b": keep-alive\n\n"
+# 저장 전에 제거하는 인용 마커 (예: 【3:0†title】)
+CITATION_RE = re.compile(r"【[^】]*】")
+# 이보다 긴 텍스트의 정규식 처리는 이벤트 루프를 막지 않도록 스레드에서 수행
+OFFLOAD_TEXT_THRESHOLD = 16 * 1024
+# tool_state 이벤트에서 제외하는 필드 (클라이언트가 쓰지 않는 대용량 서버 측 캐시)
+TOOL_STATE_EXCLUDE = {"url_to_page"}
+# 툴 호출도 내용도 없는 응답이 이 횟수만큼 연속으로 이어지면 재시도를 멈춤
+MAX_EMPTY_RETRIES = 2
+
+
+def _sse_frame(event: str, data) -> bytes:
+    """SSE `data:` 프레임을 orjson으로 직렬화합니다."""
+    payload = orjson.dumps({"event": event, "data": data}, option=orjson.OPT_NON_STR_KEYS)
+    return DATA_PREFIX + payload + FRAME_SUFFIX
+
+
+async def _strip_citations(content: str) -> str:
+    """인용 마커를 제거합니다. 짧은 텍스트는 스레드 전환 비용이 더 크므로 그대로 처리합니다."""
+    if len(content) > OFFLOAD_TEXT_THRESHOLD:
+        content = await asyncio.to_thread(CITATION_RE.sub, "", content)
+    else:
+        content = CITATION_RE.sub("", content)
+    return content.strip()
+
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _run_in_background(coro) -> asyncio.Task:
+    """
+    요청 태스크가 취소되어도 끝까지 실행되어야 하는 후처리를 별도 태스크로 실행합니다.
+    완료될 때까지 참조를 유지하며, 결과를 기다려야 하면 반환된 태스크를 `asyncio.shield`로 기다립니다.
+    """
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _persist_assistant_turn(chat_id: str, history: list[dict], last_message: dict) -> None:
+    """마지막 메시지(assistant면 인용 마커 제거)를 history에 추가하고 세션 저장소에 기록합니다."""
+    try:
+        if isinstance(last_message, dict) and last_message.get("role") == "assistant":
+            content = last_message.get("content", "")
+            if isinstance(content, str):
+                content = await _strip_citations(content)
+                last_message = {**last_message, "content": content}
+
+        history.append(last_message)
+        await store.save_messages(chat_id, history)
+    except Exception:
+        log.exception("failed to save messages", extra={"chat_id": chat_id})
+
+
+async def _watch_disconnect(request: Request, client_disconnected: asyncio.Event) -> None:
+    """
+    ASGI `http.disconnect` 메시지를 기다렸다가 `client_disconnected`를 설정합니다.
+    청크마다 `request.is_disconnected()`를 폴링하지 않도록 요청당 한 번만 실행됩니다.
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            client_disconnected.set()
+            return
+
+
+async def _drain_frames(queue: asyncio.Queue, client_disconnected: asyncio.Event):
+    """
+    큐의 SSE 프레임을 내보냅니다. 소비가 생산보다 느려 이미 쌓인 프레임은 한 번에 이어 붙여
+    소켓 쓰기 횟수를 줄이고, 혼자 도착한 프레임은 기다리지 않고 바로 보냅니다. None을 만나면 종료합니다.
+    """
+    while True:
+        chunk = await queue.get()
+        if chunk is None or client_disconnected.is_set():
+            return
+        parts = [chunk]
+        finished = False
+        while not queue.empty():
+            chunk = queue.get_nowait()
+            if chunk is None:
+                finished = True
+                break
+            parts.append(chunk)
+        yield parts[0] if len(parts) == 1 else b"".join(parts)
+        if finished:
+            return
+
+
+_multiturn_agent = None
+
+
+def _get_multiturn_agent():
+    """
+    멀티턴 Agent는 히스토리 저장소 외에 요청별 상태가 없으므로 프로세스당 하나만 만들어 재사용합니다.
+    """
+    global _multiturn_agent
+    if _multiturn_agent is None:
+        from app.langchain_agent import LangChainAgent
+        from app.langchain_tools import get_langchain_tools
+
+        agent = LangChainAgent(model="gpt-4o", temperature=0.2, max_history=10)
+        agent.add_tools(get_langchain_tools())
+        _multiturn_agent = agent
+    return _multiturn_agent
+
 
 class GenerateRequest(BaseModel):
     question: str
@@ -41,20 +151,19 @@ async def chat_stream(
     """
     SSE 프로토콜을 사용하여 채팅 스트리밍을 제공합니다.
     """
-    queue: asyncio.Queue[str] = asyncio.Queue()
-    SENTINEL = "__STREAM_DONE__"
+    # None은 스트림 종료를 뜻합니다.
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue()
     client_disconnected = asyncio.Event()
 
     async def emit(event: str, data):
-        payload = {"event": event, "data": data}
-        await queue.put(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n")
+        await queue.put(_sse_frame(event, data))
 
     async def heartbeat():
         while True:
             if client_disconnected.is_set():
                 break
             await asyncio.sleep(10)
-            await queue.put(": keep-alive\n\n")
+            await queue.put(KEEP_ALIVE)
 
     async def runner():
         # 변수 초기화 (예외 발생 시에도 finally에서 사용할 수 있도록)
@@ -70,10 +179,7 @@ async def chat_stream(
             if req.userInfo:
                 states.user_id = req.userInfo.get("id")
 
-            system_prompt = (ROOT_DIR / "prompts" / "system.txt").read_text(encoding="utf-8").format(
-                current_date=datetime.now().strftime("%Y-%m-%d"),
-                locale="ko-KR"
-            )
+            system_prompt = render_system_prompt(datetime.now().strftime("%Y-%m-%d"), "ko-KR")
             
             # model_set_context 초기화 (user_id가 없어도 사용할 수 있도록)
             model_set_context = []
@@ -85,11 +191,9 @@ async def chat_stream(
                             "content": "### User Memory\n" + "\n".join([f"{idx}. {msc}" for idx, msc in enumerate(model_set_context_list,   start=1)])
                         }]
             
-            persisted = (await store.get_messages(chat_id)) or []
-            history = [
-                *persisted,
-                {"role": "user", "content": req.question}
-            ]
+            # get_messages는 호출자 소유의 새 리스트를 반환하므로 다시 복사하지 않고 이어 붙임
+            history = (await store.get_messages(chat_id)) or []
+            history.append({"role": "user", "content": req.question})
             
             states.messages = [
                 {"role": "system", "content": system_prompt},
@@ -98,28 +202,42 @@ async def chat_stream(
             ]
             states.tools = await get_tools_for_llm()
             tool_map = await get_tool_map()
+            empty_retries = 0
 
             while True:
                 if client_disconnected.is_set():
                     break
                 
-                await emit("tool_state", states.tool_state.model_dump())
+                # dict로 변환하지 않고 pydantic이 만든 JSON을 그대로 프레임에 삽입, 바뀌지 않았으면 생략
+                # url_to_page는 open 툴의 스크롤용 서버 측 페이지 캐시(본문 전체)라 프레임에서 제외
+                tool_state_json = states.tool_state.model_dump_json(exclude=TOOL_STATE_EXCLUDE)
+                tool_state_hash = hash(tool_state_json)
+                if tool_state_hash != states.tool_state_hash:
+                    states.tool_state_hash = tool_state_hash
+                    await emit("tool_state", orjson.Fragment(tool_state_json))
                 
                 # 최종 메시지를 저장할 변수
                 final_message = None
                 
-                # 스트림 처리
-                async for res in call_llm_stream(
-                    messages=states.messages,
-                    tools=states.tools,
-                    temperature=0.2
-                ):
-                    if is_sse(res):
-                        # SSE 이벤트 (토큰 등)는 즉시 emit
-                        await emit(res["event"], res["data"])
-                    else:
-                        # 최종 메시지는 나중에 처리하기 위해 저장
-                        final_message = res
+                # 스트림 처리 (토큰은 TokenBatcher로 묶어서 emit, 첫 토큰은 즉시)
+                batcher = TokenBatcher(emit)
+                try:
+                    async for res in call_llm_stream(
+                        messages=states.messages,
+                        tools=states.tools,
+                        temperature=0.2,
+                        prompt_cache_key=make_prompt_cache_key(system_prompt, "chat"),
+                    ):
+                        if not is_sse(res):
+                            # 최종 메시지는 나중에 처리하기 위해 저장
+                            final_message = res
+                        elif res["event"] == "token":
+                            await batcher.add(res["data"])
+                        else:
+                            await batcher.flush()
+                            await emit(res["event"], res["data"])
+                finally:
+                    await batcher.flush()
                 
                 # 최종 메시지가 없으면 루프 종료
                 if final_message is None:
@@ -135,12 +253,20 @@ async def chat_stream(
                 # 툴 호출이 없고 콘텐츠가 있으면 종료
                 if not tool_calls and contents:
                     break
-                # 툴 호출이 없고 콘텐츠가 없으면 다시 인퍼런스 시도
+                # 툴 호출이 없고 콘텐츠가 없으면 다시 인퍼런스 시도 (횟수 제한)
                 elif not tool_calls and not contents:
+                    empty_retries += 1
+                    if empty_retries >= MAX_EMPTY_RETRIES:
+                        log.warning("빈 응답이 반복되어 재시도 중단", extra={"chat_id": chat_id, "retries": empty_retries})
+                        break
                     continue
                 
                 # 툴 호출이 있으면 툴 호출 처리
                 if tool_calls:
+                    # 진행이 있었으므로 연속 빈 응답 카운터 초기화
+                    empty_retries = 0
+                    # 1) 인자 파싱 + 실행 전 이벤트 emit (원래 순서대로)
+                    pending = []
                     for tool_call in tool_calls:
                         tool_name = tool_call.get('function', {}).get('name')
                         if not tool_name:
@@ -149,100 +275,125 @@ async def chat_stream(
                         
                         try:
                             tool_args_str = tool_call.get('function', {}).get('arguments', '{}')
-                            tool_args = json.loads(tool_args_str) if tool_args_str else {}
-                        except json.JSONDecodeError as e:
+                            tool_args = parse_tool_arguments(tool_args_str)
+                        except orjson.JSONDecodeError as e:
                             log.exception("tool arguments JSON 파싱 실패", extra={"chat_id": chat_id, "tool_name": tool_name, "arguments": tool_args_str})
                             tool_args = {}
                         
                         log.info("tool call", extra={"chat_id": chat_id, "tool_name": tool_name})
                         
                         try:
-                            tool_res = tool_map[tool_name](states, **tool_args)
                             # emit visible query for search tools
                             if tool_name == "search":
                                 await emit("agentFlowExecutedData", {
                                     "nodeLabel": "Visible Query Generator",
                                     "data": {
                                         "output": {
-                                            "content": json.dumps({
+                                            "content": orjson.dumps({
                                                 "visible_web_search_query": [sq.get('q', '') for sq in tool_args.get('search_query', [])]
-                                            }, ensure_ascii=False)
+                                            }).decode()
                                         }
                                     }
                                 })
                             elif tool_name == "open":
-                                try:
-                                    if tool_args.get('id') and tool_args['id'].startswith('http'):
-                                        url = tool_args['id']
-                                    elif tool_args.get('id') is None:
-                                        url = getattr(states.tool_state, "current_url", None)
-                                    else:
-                                        url = states.tool_state.id_to_url.get(tool_args['id'])
-                                    if url:
-                                        await emit("agentFlowExecutedData", {
-                                            "nodeLabel": "Visible URL",
-                                            "data": {
-                                                "output": {
-                                                    "content": json.dumps({
-                                                        "visible_url": url
-                                                    }, ensure_ascii=False)
-                                                }
+                                if tool_args.get('id') and tool_args['id'].startswith('http'):
+                                    url = tool_args['id']
+                                elif tool_args.get('id') is None:
+                                    url = getattr(states.tool_state, "current_url", None)
+                                else:
+                                    url = states.tool_state.id_to_url.get(tool_args['id'])
+                                if url:
+                                    await emit("agentFlowExecutedData", {
+                                        "nodeLabel": "Visible URL",
+                                        "data": {
+                                            "output": {
+                                                "content": orjson.dumps({
+                                                    "visible_url": url
+                                                }).decode()
                                             }
-                                        })
-                                except Exception as e:
-                                    log.exception("open tool emit 실패", extra={"chat_id": chat_id})
-
-                            if asyncio.iscoroutine(tool_res):
-                                tool_res = await tool_res
-
-                            # If search tool returned structured results, emit them and a log event
-                            if tool_name == "search":
-                                try:
-                                    # tool_res expected to be a dict like {"results": [...]}
-                                    results = None
-                                    if isinstance(tool_res, dict) and "results" in tool_res:
-                                        results = tool_res.get("results")
-                                    elif isinstance(tool_res, list):
-                                        results = tool_res
-                                    elif isinstance(tool_res, str):
-                                        # try to parse JSON
-                                        try:
-                                            parsed = json.loads(tool_res)
-                                            results = parsed.get("results") if isinstance(parsed, dict) else parsed
-                                        except Exception:
-                                            results = None
-
-                                    if results:
-                                        # Emit agent flow node with search results (titles + sources)
-                                        await emit("agentFlowExecutedData", {
-                                            "nodeLabel": "Search Results",
-                                            "data": {
-                                                "output": {
-                                                    "content": json.dumps({
-                                                        "visible_search_results": [
-                                                            {"id": r.get("id"), "title": r.get("title"), "source": r.get("source"), "url": r.get("url")}
-                                                            for r in results
-                                                        ]
-                                                    }, ensure_ascii=False)
-                                                }
+                                        }
+                                    })
+                        except Exception as e:
+                            log.exception("tool emit 실패", extra={"chat_id": chat_id, "tool_name": tool_name})
+                        
+                        pending.append((tool_call, tool_name, tool_args))
+                    
+                    async def run_tool(tool_name: str, tool_args: dict):
+                        try:
+                            # get_tool_map이 모든 툴을 코루틴 함수로 맞춰 두므로 바로 await
+                            return await tool_map[tool_name](states, **tool_args)
+                        except Exception as e:
+                            log.exception("tool call failed", extra={"chat_id": chat_id, "tool_name": tool_name})
+                            return f"Error calling {tool_name}: {e}\n\nTry again with different arguments."
+                    
+                    # 2) 서로 독립적인 툴 호출을 동시에 실행
+                    #    이름과 인자 문자열이 같은 호출은 한 번만 실행하고 결과를 공유
+                    unique_calls: dict[tuple[str, str], tuple[str, dict]] = {}
+                    call_keys = []
+                    for tool_call, tool_name, tool_args in pending:
+                        key = (tool_name, tool_call.get('function', {}).get('arguments', '{}'))
+                        unique_calls.setdefault(key, (tool_name, tool_args))
+                        call_keys.append(key)
+                    unique_results = dict(zip(
+                        unique_calls,
+                        await asyncio.gather(
+                            *(run_tool(tool_name, tool_args) for tool_name, tool_args in unique_calls.values())
+                        ),
+                    ))
+                    tool_results = [unique_results[key] for key in call_keys]
+                    
+                    # 3) 결과 이벤트 emit + tool 메시지 추가 (원래 순서 유지)
+                    for (tool_call, tool_name, _), tool_res in zip(pending, tool_results):
+                        # If search tool returned structured results, emit them and a log event
+                        if tool_name == "search":
+                            try:
+                                # tool_res expected to be a dict like {"results": [...]}
+                                results = None
+                                if isinstance(tool_res, dict) and "results" in tool_res:
+                                    results = tool_res.get("results")
+                                elif isinstance(tool_res, list):
+                                    results = tool_res
+                                elif isinstance(tool_res, str):
+                                    # try to parse JSON
+                                    try:
+                                        parsed = orjson.loads(tool_res)
+                                        results = parsed.get("results") if isinstance(parsed, dict) else parsed
+                                    except Exception:
+                                        results = None
+
+                                if results:
+                                    # Emit agent flow node with search results (titles + sources)
+                                    await emit("agentFlowExecutedData", {
+                                        "nodeLabel": "Search Results",
+                                        "data": {
+                                            "output": {
+                                                "content": orjson.dumps({
+                                                    "visible_search_results": [
+                                                        {"id": r.get("id"), "title": r.get("title"), "source": r.get("source"), "url": r.get("url")}
+                                                        for r in results
+                                                    ]
+                                                }).decode()
                                             }
-                                        })
+                                        }
+                                    })
 
-                                        # Also emit a tool_log event so frontend can display full snippets
-                                        await emit("tool_log", {
-                                            "tool": "search",
-                                            "results": results
-                                        })
+                                    # Also emit a tool_log event so frontend can display full snippets
+                                    await emit("tool_log", {
+                                        "tool": "search",
+                                        "results": results
+                                    })
 
-                                        log.info("search tool executed", extra={"chat_id": chat_id, "count": len(results)})
-                                except Exception as e:
-                                    log.exception("failed to emit search results", extra={"chat_id": chat_id})
-                        except Exception as e:
-                            log.exception("tool call failed", extra={"chat_id": chat_id, "tool_name": tool_name})
-                            tool_res = f"Error calling {tool_name}: {e}\n\nTry again with different arguments."
+                                    log.info("search tool executed", extra={"chat_id": chat_id, "count": len(results)})
+                            except Exception as e:
+                                log.exception("failed to emit search results", extra={"chat_id": chat_id})
                         
                         tool_call_id = tool_call.get('id', '')
-                        states.messages.append({"role": "tool", "content": str(tool_res), "tool_call_id": tool_call_id})
+                        # 구조화된 결과(검색 결과 목록, MCP 응답 등)는 repr 대신 JSON으로 전달
+                        if isinstance(tool_res, str):
+                            tool_content = tool_res
+                        else:
+                            tool_content = orjson.dumps(tool_res, default=str).decode()
+                        states.messages.append({"role": "tool", "content": tool_content, "tool_call_id": tool_call_id})
 
         except Exception as e:
             log.exception("chat stream failed")
@@ -250,43 +401,29 @@ async def chat_stream(
             await emit("token", f"\n\n오류가 발생했습니다: {e}")
         finally:
             # states와 history가 정의되어 있고 유효한 경우에만 메시지 저장
-            try:
-                if states and hasattr(states, 'messages') and states.messages and chat_id:
-                    last_message = states.messages[-1]
-                    
-                    if isinstance(last_message, dict) and last_message.get("role") == "assistant":
-                        content = last_message.get("content", "")
-                        if isinstance(content, str):
-                            content = re.sub(r"【[^】]*】", "", content).strip()
-                            last_message = {**last_message, "content": content}
-                    
-                    # history에 마지막 메시지 추가하고 저장
-                    if history:
-                        history.append(last_message)
-                        await store.save_messages(chat_id, history)
-            except Exception as e:
-                log.exception("failed to save messages in finally block", extra={"chat_id": chat_id})
+            # result 전에 저장을 끝내 바로 이어지는 요청이 이전 히스토리를 읽고 덮어쓰지 않도록 함
+            # 저장은 별도 태스크라 클라이언트 연결 종료로 이 요청이 취소되어도 끝까지 진행됨
+            if states and hasattr(states, 'messages') and states.messages and chat_id and history:
+                await asyncio.shield(
+                    _run_in_background(_persist_assistant_turn(chat_id, history, states.messages[-1]))
+                )
             
             await emit("result", None)
-            await queue.put(SENTINEL)
+            await queue.put(None)
             log.info("chat stream finished", extra={"chat_id": chat_id})
 
     async def sse():
         producer = asyncio.create_task(runner())
         pinger = asyncio.create_task(heartbeat())
+        watcher = asyncio.create_task(_watch_disconnect(request, client_disconnected))
         try:
-            while True:
-                if await request.is_disconnected():
-                    client_disconnected.set()
-                    break
-                chunk = await queue.get()
-                if chunk == SENTINEL:
-                    break
+            async for chunk in _drain_frames(queue, client_disconnected):
                 yield chunk
         finally:
             client_disconnected.set()
             producer.cancel()
             pinger.cancel()
+            watcher.cancel()
 
     return StreamingResponse(
         sse(), 
@@ -303,33 +440,25 @@ async def chat_langgraph(
     req: GenerateRequest,
     request: Request
 ) -> StreamingResponse:
-    queue: asyncio.Queue[str] = asyncio.Queue()
-    SENTINEL = "__STREAM_DONE__"
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue()
     client_disconnected = asyncio.Event()
 
     async def emit(event: str, data):
-        payload = {"event": event, "data": data}
-        await queue.put(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n")
+        await queue.put(_sse_frame(event, data))
 
     async def heartbeat():
         while True:
             if client_disconnected.is_set():
                 break
             await asyncio.sleep(10)
-            await queue.put(": keep-alive\n\n")
+            await queue.put(KEEP_ALIVE)
 
     async def runner():
         chat_id = req.chatId or uuid4().hex
         user_id = req.userInfo.get("id") if req.userInfo else None
 
         try:
-            await emit("token", "")
-
-            history_records = await history_store.get_chat_history(chat_id, limit=10)
-            history_messages = [
-                {"role": msg.get("role", "assistant"), "content": msg.get("content", "")}
-                for msg in history_records
-            ]
+            history_messages = await history_store.get_llm_messages(chat_id, limit=10)
 
             await history_store.save_message(chat_id, "user", req.question)
 
@@ -352,7 +481,7 @@ async def chat_langgraph(
                 "chat_id": chat_id,
                 "user_id": user_id,
                 "search_iterations": final_state.get("search_iterations", 0),
-                "summaries": final_state.get("search_results_summary", []),
+                "summaries": [s for s in final_state.get("search_results_summary", []) if s],
             })
 
         except asyncio.CancelledError:
@@ -362,26 +491,24 @@ async def chat_langgraph(
             await emit("error", str(e))
             await emit("token", f"\n\n오류가 발생했습니다: {e}")
         finally:
+            # result 이벤트 전에 버퍼링된 히스토리를 기록
+            await history_store.flush()
             await emit("result", None)
-            await queue.put(SENTINEL)
+            await queue.put(None)
             log.info("langgraph chat finished", extra={"chat_id": chat_id})
 
     async def sse():
         producer = asyncio.create_task(runner())
         pinger = asyncio.create_task(heartbeat())
+        watcher = asyncio.create_task(_watch_disconnect(request, client_disconnected))
         try:
-            while True:
-                if await request.is_disconnected():
-                    client_disconnected.set()
-                    break
-                chunk = await queue.get()
-                if chunk == SENTINEL:
-                    break
+            async for chunk in _drain_frames(queue, client_disconnected):
                 yield chunk
         finally:
             client_disconnected.set()
             producer.cancel()
             pinger.cancel()
+            watcher.cancel()
 
     return StreamingResponse(
         sse(),
@@ -398,64 +525,46 @@ async def chat_multiturn(
     LangChain Agent를 이용한 멀티턴 대화
     최대 10개 메시지 윈도우를 유지합니다.
     """
-    queue: asyncio.Queue[str] = asyncio.Queue()
-    SENTINEL = "__STREAM_DONE__"
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue()
     client_disconnected = asyncio.Event()
 
     async def emit(event: str, data):
-        payload = {"event": event, "data": data}
-        await queue.put(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n")
+        await queue.put(_sse_frame(event, data))
 
     async def heartbeat():
         while True:
             if client_disconnected.is_set():
                 break
             await asyncio.sleep(10)
-            await queue.put(": keep-alive\n\n")
+            await queue.put(KEEP_ALIVE)
 
     async def runner():
         chat_id = None
         user_id = None
         
         try:
-            # LangChain Agent 초기화
-            from app.langchain_agent import LangChainAgent
-            from app.langchain_tools import get_langchain_tools
-            
             chat_id = req.chatId or uuid4().hex
             if req.userInfo:
                 user_id = req.userInfo.get("id")
             
             log.info("multiturn chat started", extra={"chat_id": chat_id, "user_id": user_id})
             
-            # Agent 생성
-            agent = LangChainAgent(model="gpt-4o", temperature=0.2, max_history=10)
-            agent.add_tools(get_langchain_tools())
+            agent = _get_multiturn_agent()
             
-            # 사용자 입력 첫 토큰
-            await emit("token", "")
-            
-            streamed_text: list[str] = []
-
-            async def handle_token(token: str):
-                if not token:
-                    return
-                streamed_text.append(token)
-                await emit("token", token)
+            # 토큰은 모델이 생성하는 즉시 on_token으로 전달되며, 프레임 수를 줄이기 위해 묶어서 emit
+            batcher = TokenBatcher(emit)
 
             try:
                 # Agent로 메시지 처리 (토큰 스트리밍 포함)
-                response, metadata = await agent.process_message(
-                    user_input=req.question,
-                    chat_id=chat_id,
-                    user_id=user_id,
-                    on_token=handle_token
-                )
-
-                # 콜백이 호출되지 않은 경우를 대비한 폴백 처리
-                if not streamed_text and response:
-                    for char in response:
-                        await emit("token", char)
+                try:
+                    _, metadata = await agent.process_message(
+                        user_input=req.question,
+                        chat_id=chat_id,
+                        user_id=user_id,
+                        on_token=batcher.add
+                    )
+                finally:
+                    await batcher.flush()
 
                 # 메타데이터 전달
                 await emit("metadata", metadata)
@@ -477,26 +586,24 @@ async def chat_multiturn(
             await emit("token", f"\n\n오류가 발생했습니다: {e}")
         
         finally:
+            # result 이벤트 전에 버퍼링된 히스토리를 기록
+            await history_store.flush()
             await emit("result", None)
-            await queue.put(SENTINEL)
+            await queue.put(None)
             log.info("multiturn chat finished", extra={"chat_id": chat_id})
 
     async def sse():
         producer = asyncio.create_task(runner())
         pinger = asyncio.create_task(heartbeat())
+        watcher = asyncio.create_task(_watch_disconnect(request, client_disconnected))
         try:
-            while True:
-                if await request.is_disconnected():
-                    client_disconnected.set()
-                    break
-                chunk = await queue.get()
-                if chunk == SENTINEL:
-                    break
+            async for chunk in _drain_frames(queue, client_disconnected):
                 yield chunk
         finally:
             client_disconnected.set()
             producer.cancel()
             pinger.cancel()
+            watcher.cancel()
 
     return StreamingResponse(
         sse(), 
@@ -3,23 +3,17 @@
 LangChain을 사용하여 OpenAI API와 멀티턴 대화 및 스트리밍을 지원합니다.
 툴 실행(함수 호출)은 에이전트 내부에서 수행하지 않고 ToolHandler 같은 외부 컴포넌트로 위임합니다.
 """
+import hashlib
 import os
-from typing import Optional, List, Tuple, Callable, Awaitable
+from typing import Any, Dict, Iterable, Mapping, Optional, List, Tuple, Callable, Awaitable, Union
 from datetime import datetime
 
-# ChatOpenAI may not be available in all langchain versions; import optionally
-try:
-    from langchain.chat_models import ChatOpenAI  # type: ignore
-    _HAS_LANGCHAIN_CHAT = True
-except Exception:
-    ChatOpenAI = None  # type: ignore
-    _HAS_LANGCHAIN_CHAT = False
-
 from app.logger import get_logger
-from app.stores.chat_history import ChatHistoryStore
+from app.stores.chat_history import history_store
+from app.stores.response_cache import ResponseCache
 
 log = get_logger(__name__)
-history_store = ChatHistoryStore()
+response_cache = ResponseCache()
 
 
 class LangChainAgent:
@@ -35,56 +29,32 @@ class LangChainAgent:
         api_key = os.getenv("OPENAI_API_KEY", "")
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY 환경 변수가 설정되지 않았습니다.")
-        
-        # Prefer LangChain's ChatOpenAI when available; otherwise rely on call_llm_stream helper
-        if _HAS_LANGCHAIN_CHAT and ChatOpenAI is not None:
-            try:
-                self.client = ChatOpenAI(model=model, temperature=temperature, openai_api_key=api_key)
-            except Exception:
-                log.warning("Failed to initialize ChatOpenAI; falling back to streaming helper")
-                self.client = None
-        else:
-            log.warning("ChatOpenAI not available in the installed langchain package; using streaming helper only")
-            self.client = None
+
+        # LLM 호출은 항상 app.utils.call_llm_stream(공유 AsyncOpenAI 클라이언트)으로 스트리밍합니다.
 
         self.max_history = max_history
-        self.system_prompt = self._load_system_prompt()
         self.model = model
         self.temperature = temperature
         # ToolHandler is created so external code can register tools via agent.add_tools/add_tool
         self.tool_handler = ToolHandler()
     
+    @property
+    def system_prompt(self) -> str:
+        """오늘 날짜 기준 시스템 프롬프트 (렌더링 결과는 app.utils에서 캐시됨)"""
+        return self._load_system_prompt()
+
     def _load_system_prompt(self) -> str:
         """시스템 프롬프트 로드"""
-        from app.utils import ROOT_DIR
+        from app.utils import render_system_prompt
         try:
-            prompt_file = ROOT_DIR / "prompts" / "system.txt"
-            system_prompt = prompt_file.read_text(encoding="utf-8")
-            return system_prompt.format(
-                current_date=datetime.now().strftime("%Y-%m-%d"),
-                locale="ko-KR"
-            )
+            return render_system_prompt(datetime.now().strftime("%Y-%m-%d"), "ko-KR")
         except Exception as e:
             log.warning(f"Failed to load system prompt: {e}")
             return "You are a helpful AI assistant."
     
     async def get_chat_history(self, chat_id: str) -> List[dict]:
-        """SQLite에서 채팅 히스토리 로드"""
-        messages = await history_store.get_chat_history(chat_id, limit=self.max_history)
-        
-        # 백엔드 메시지 형식을 LLM 형식으로 변환
-        chat_history = []
-        for msg in messages:
-            role = msg.get("role")
-            content = msg.get("content")
-            
-            api_msg = {
-                "role": role,
-                "content": content,
-            }
-            chat_history.append(api_msg)
-        
-        return chat_history
+        """SQLite에서 채팅 히스토리를 LLM 형식으로 로드"""
+        return await history_store.get_llm_messages(chat_id, limit=self.max_history)
     
     async def process_message(
         self,
@@ -99,6 +69,9 @@ class LangChainAgent:
 
         툴 호출이 모델 응답에 포함되더라도 실제 툴 실행은 이 에이전트에서 수행하지 않습니다.
         대신 결과의 메타데이터로 tool_calls 정보를 반환합니다.
+
+        같은 사용자가 같은 대화 맥락에서 같은 질문을 하면 LLM 호출 없이 캐시된 응답을 반환합니다.
+        `user_id`가 없거나 `no_cache=True`를 넘기면 캐시를 사용하지 않습니다.
         """
         try:
             # 히스토리 로드
@@ -106,6 +79,28 @@ class LangChainAgent:
             
             # 사용자 메시지 저장
             await history_store.save_message(chat_id, "user", user_input)
+
+            # 익명 요청은 서로 다른 사용자끼리 네임스페이스를 공유하게 되므로 캐시하지 않음
+            use_cache = user_id is not None and not kwargs.get("no_cache", False)
+            cache_namespace = self._cache_namespace(user_id, chat_history) if use_cache else ""
+            cached = response_cache.get(cache_namespace, user_input) if use_cache else None
+            if cached is not None:
+                log.info("response cache hit", extra={"chat_id": chat_id, "user_id": user_id})
+                if on_token is not None:
+                    try:
+                        await on_token(cached)
+                    except Exception as callback_error:
+                        log.warning("on_token callback failed: %s", callback_error)
+                await history_store.save_message(chat_id, "assistant", cached)
+                return cached, {
+                    "chat_id": chat_id,
+                    "user_id": user_id,
+                    "total_messages": len(chat_history) + 2,
+                    "model": self.model,
+                    "streamed_text": cached,
+                    "tool_calls": [],
+                    "cache": "hit",
+                }
             
             # 메시지 구성
             messages = [
@@ -115,22 +110,24 @@ class LangChainAgent:
             ]
 
             # Use streaming helper in app.utils to keep streaming behavior
-            from app.utils import call_llm_stream
+            from app.utils import call_llm_stream, make_prompt_cache_key
 
             final_message = None
-            streamed_text_parts: List[str] = []
 
-            async for res in call_llm_stream(messages=messages, model=self.model, temperature=self.temperature):
+            async for res in call_llm_stream(
+                messages=messages,
+                model=self.model,
+                temperature=self.temperature,
+                prompt_cache_key=make_prompt_cache_key(self.system_prompt, "multiturn"),
+            ):
                 # streaming yields token events and then a final_message dict
                 if isinstance(res, dict) and res.get("event") == "token":
                     token_piece = res.get("data", "")
-                    if token_piece:
-                        streamed_text_parts.append(token_piece)
-                        if on_token is not None:
-                            try:
-                                await on_token(token_piece)
-                            except Exception as callback_error:
-                                log.warning("on_token callback failed: %s", callback_error)
+                    if token_piece and on_token is not None:
+                        try:
+                            await on_token(token_piece)
+                        except Exception as callback_error:
+                            log.warning("on_token callback failed: %s", callback_error)
                 else:
                     final_message = res
 
@@ -143,12 +140,15 @@ class LangChainAgent:
             # Always save the assistant message to history
             await history_store.save_message(chat_id, "assistant", assistant_content)
 
+            if use_cache and assistant_content and not tool_calls:
+                response_cache.set(cache_namespace, user_input, assistant_content)
+
             metadata = {
                 "chat_id": chat_id,
                 "user_id": user_id,
                 "total_messages": len(chat_history) + 2,
                 "model": self.model,
-                "streamed_text": "".join(streamed_text_parts),
+                "streamed_text": assistant_content,
                 "tool_calls": tool_calls,  # callers can decide whether to execute tools
             }
 
@@ -157,6 +157,13 @@ class LangChainAgent:
             log.exception(f"Failed to process message: {e}")
             raise
     
+    @staticmethod
+    def _cache_namespace(user_id: str, chat_history: List[dict]) -> str:
+        """사용자 + 직전 메시지 기준 캐시 네임스페이스 (맥락이 다르면 캐시를 공유하지 않음)"""
+        last_content = chat_history[-1].get("content") or "" if chat_history else ""
+        context_hash = hashlib.sha1(last_content.encode("utf-8")).hexdigest()
+        return f"{user_id}:{context_hash}"
+
     async def get_full_context(self, chat_id: str) -> List[dict]:
         """전체 채팅 히스토리 조회"""
         return await history_store.get_chat_history(chat_id, limit=self.max_history)
@@ -172,7 +179,7 @@ class LangChainAgent:
             self.tool_handler = ToolHandler()
         self.tool_handler.add_tool(tool_obj)
     
-    def add_tools(self, tools: List) -> None:
+    def add_tools(self, tools: Union[Mapping[str, Any], Iterable]) -> None:
         if not hasattr(self, "tool_handler") or self.tool_handler is None:
             self.tool_handler = ToolHandler()
         self.tool_handler.add_tools(tools)
@@ -182,20 +189,27 @@ class LangChainAgent:
 class ToolHandler:
     """툴 호출 및 관리 로직 (에이전트 내부에서 직접 실행하지 않음)"""
     def __init__(self):
-        self.tools = []
+        # 툴 이름 -> 툴 (이름으로 바로 조회)
+        self.tools: Dict[str, Any] = {}
 
     def add_tool(self, tool_obj) -> None:
-        self.tools.append(tool_obj)
+        name = getattr(tool_obj, "name", None) or getattr(tool_obj, "__name__", None)
+        self.tools[name] = tool_obj
 
-    def add_tools(self, tools: List) -> None:
-        self.tools.extend(tools)
+    def add_tools(self, tools: Union[Mapping[str, Any], Iterable]) -> None:
+        if isinstance(tools, Mapping):
+            self.tools.update(tools)
+        else:
+            for tool_obj in tools:
+                self.add_tool(tool_obj)
 
     async def execute_tool(self, tool_name: str, args: dict) -> str:
-        tool = next((t for t in self.tools if getattr(t, "name", None) == tool_name), None)
+        tool = self.tools.get(tool_name)
         if not tool:
             return f"Tool {tool_name} not found."
         try:
-            result = tool.run(args)
+            # LangChain Tool 객체는 run(args), 일반 함수는 키워드 인자로 호출
+            result = tool.run(args) if hasattr(tool, "run") else tool(**args)
             if hasattr(result, "__await__"):
                 result = await result
             return result
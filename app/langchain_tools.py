@@ -2,6 +2,7 @@
 기존 도구들을 LangChain Tool로 래핑하는 모듈
 """
  # langchain_core.tools import 제거 (불필요)
+from types import MappingProxyType
 from typing import Optional, List
 import json
 
@@ -91,10 +92,14 @@ async def manage_memory(
         return f"메모리 관리 중 오류가 발생했습니다: {str(e)}"
 
 
+# 툴 구성은 고정이므로 한 번만 만들고 읽기 전용으로 공유
+_LANGCHAIN_TOOLS = MappingProxyType({
+    "search": search_web,
+    "open": open_url,
+    "memory": manage_memory,
+})
+
+
 def get_langchain_tools():
-    """모든 LangChain Tool 반환"""
-    return {
-        "search": search_web,
-        "open": open_url,
-        "memory": manage_memory,
-    }
+    """모든 LangChain Tool 반환 (이름 -> 함수, 읽기 전용 매핑)"""
+    return _LANGCHAIN_TOOLS
@@ -1,41 +1,206 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Awaitable, Callable, Dict, List, Optional, TypedDict
-
+import functools
+import hashlib
+import operator
+import re
+from contextlib import aclosing
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, Optional, TypedDict
+
+import orjson
 from langgraph.graph import StateGraph, END
 
 from app.logger import get_logger
 from app.utils import (
-    ROOT_DIR,
     _get_default_model,
-    _get_openai_client,
+    call_llm_nonstream,
     call_llm_stream,
+    make_prompt_cache_key,
+    render_system_prompt,
     States,
-    ToolState,
+    TokenBatcher,
 )
+from app.stores.response_cache import ResponseCache, normalize_text
 from app.tools.web_search import web_search
 
 log = get_logger(__name__)
 
+# Refinement / summarization answers keyed by (model, temperature, system prompt) and matched
+# on the exact user prompt. No similarity tier: the prompts are mostly shared snippets, so two
+# different questions over the same results would look like near-duplicates.
+llm_cache = ResponseCache(max_namespaces=256)
+_llm_cache_stats = {"hits": 0, "misses": 0}
+# Questions the answer stream sent to search, keyed by model. A hit routes straight to
+# search instead of opening a stream that would only emit the search signal again.
+route_cache = ResponseCache(max_namespaces=16, similarity_threshold=0.95)
+
+MAX_SEARCH_ITERATIONS = 2
+
+# Output caps for the auxiliary LLM calls: the refinement answers with one search query
+# and the summary with 3-5 sentences plus a tag.
+REFINEMENT_MAX_TOKENS = 48
+SUMMARY_MAX_TOKENS = 512
+
+# Static system prompts (identical prefixes also keep OpenAI's prompt cache warm) and the
+# templates for their per-request user messages.
+_REFINE_SYSTEM_PROMPT = (
+    "당신은 검색 질의 최적화 도우미입니다. 사용자의 질문과 지금까지의 검색 요약을 참고하여\n"
+    "다음 검색을 위한 가장 유용한 단일 검색어를 만드세요.\n"
+    "가능한 한 구체적으로 작성하며 한국어 사용자에게 적합한 언어를 선택하세요.\n"
+    "출력은 검색어 문장만 포함해야 합니다."
+)
+_REFINE_USER_TEMPLATE = "사용자 질문: {question}\n이전 검색 요약: {summaries}\n다음 검색어를 제안하세요."
+_SUMMARY_SYSTEM_PROMPT = (
+    "당신은 정보를 요약하는 전문가입니다. 아래 검색 결과를 참고하여 핵심 정보를 3-5문장으로 요약하세요.\n"
+    "출처가 있다면 괄호로 표기하고, 중요 사실을 위주로 작성하세요.\n"
+    "요약만으로 사용자 질문에 충분히 답할 수 있으면 마지막 줄에 '[CONFIDENT]'를, "
+    "추가 검색이 필요하면 '[NEED_MORE]'를 붙이세요."
+)
+_SUMMARY_USER_TEMPLATE = "사용자 질문: {question}\n검색 결과:\n{snippets}"
+_FINAL_SYSTEM_PROMPT = (
+    "당신은 Perplexity 스타일의 AI 어시스턴트입니다.\n"
+    "다음 검색 요약과 검색 결과를 참고하여 질문에 답변하세요.\n"
+    "필요 시 출처를 간단히 언급하되, 말투는 친절하고 단정하게 유지하세요."
+)
+_FINAL_USER_TEMPLATE = "질문: {question}\n누적 검색 요약:\n{context}"
+
+_SNIPPET_TEMPLATE = "- 제목: {title}\n  요약: {snippet}\n  URL: {url}"
+_SNIPPET_FIELDS = ("title", "snippet", "url")
+# Router pre-filter: time-sensitive keywords always need a search, short greetings/thanks never do.
+_SEARCH_TRIGGER_RE = re.compile(r"오늘|최신|뉴스|현재|지금|실시간|price|latest|news|today", re.IGNORECASE)
+_SMALL_TALK_RE = re.compile(
+    r"^(안녕|반가|고마|감사|ㅎㅎ|ㅋㅋ|hi\b|hello\b|hey\b|thanks?\b|thank you\b)", re.IGNORECASE
+)
+# Ambiguous questions are answered directly unless the model opens its reply with this signal.
+_SEARCH_SIGNAL = "[SEARCH]"
+_SEARCH_SIGNAL_INSTRUCTION = (
+    "\n\n최신 정보나 외부 지식이 있어야 정확히 답할 수 있는 질문이라면 답변하지 말고 "
+    f"다른 말 없이 {_SEARCH_SIGNAL} 만 출력하세요. "
+    "경미한 인사나 이미 알고 있는 내용으로 답할 수 있다면 바로 답변하세요."
+)
+# Tolerates case, inner spaces and leading quotes/markdown around the signal; any miss means
+# the model is answering directly.
+_SEARCH_SIGNAL_RE = re.compile(r"[\s\"'`*]*\[\s*SEARCH\s*\]", re.IGNORECASE)
+_SIGNAL_NOISE = "\"'`*"
+# Appended by the summarizer to say whether another search iteration is needed.
+_CONFIDENCE_TAG_RE = re.compile(r"\[(CONFIDENT|NEED_MORE)\]")
+
+# In-flight LLM/search calls shared by concurrent callers with the same key.
+_inflight: Dict[str, asyncio.Future] = {}
+
 
 class GraphState(TypedDict):
     """State shared across the LangGraph workflow."""
 
-    messages: List[Dict[str, str]]
+    # Nodes return only new messages; the reducer appends them to the history.
+    messages: Annotated[List[Dict[str, str]], operator.add]
     original_question: str
     search_iterations: int
-    search_results_summary: List[str]
+    # One slot per search iteration, preallocated in run(); unused slots stay None.
+    search_results_summary: List[Optional[str]]
     current_search_query: str | None
+    # Query for the next iteration, refined speculatively while the previous iteration was summarized.
+    next_search_query: str | None
     final_answer: str | None
+    route: str | None
+    confident: bool
 
 
+# ``data`` is either a JSON-serializable object or a pre-encoded ``orjson.Fragment``.
 Emitter = Callable[[str, Any], Awaitable[None]]
+# Nodes return only the keys they change; LangGraph merges them into GraphState.
+StateUpdate = Dict[str, Any]
+
+
+def _static_event(payload: Dict[str, Any]) -> orjson.Fragment:
+    return orjson.Fragment(orjson.dumps(payload))
+
+
+# Reasoning events whose payload never changes, encoded once at import time.
+_ROUTER_START_EVENT = _static_event({"stage": "router", "message": "요청을 분석하여 검색 필요 여부를 판단합니다."})
+_ROUTER_RESULT_EVENTS = {
+    "search": _static_event({"stage": "router", "message": "판단 결과: 검색 필요"}),
+    "general": _static_event({"stage": "router", "message": "판단 결과: 일반 대화"}),
+}
+_DIRECT_ANSWER_EVENT = _static_event({"stage": "final", "message": "검색 없이 바로 답변을 생성합니다."})
+_FINAL_ANSWER_EVENT = _static_event({"stage": "final", "message": "검색 결과를 종합하여 최종 답변을 생성합니다."})
+
+
+async def _single_flight(key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run ``factory()`` once for all concurrent callers using the same key.
+
+    The call runs in its own task, so one caller being cancelled (e.g. a client
+    disconnect) does not cancel the shared call for the others.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+
+        def _release(done: asyncio.Future) -> None:
+            if _inflight.get(key) is done:
+                del _inflight[key]
+            if not done.cancelled():
+                done.exception()
+
+        task.add_done_callback(_release)
+    return await asyncio.shield(task)
+
+
+def _cheap_route(question: str) -> Optional[str]:
+    """
+    Keyword pre-filter for the router. Returns "search" / "general" for obvious
+    questions and None when the LLM router has to decide.
+    """
+    text = question.strip()
+    if _SEARCH_TRIGGER_RE.search(text):
+        return "search"
+    if len(text) < 5 or (len(text) <= 20 and _SMALL_TALK_RE.match(text)):
+        return "general"
+    return None
+
+
+@functools.lru_cache(maxsize=4)
+def _routing_system_prompt(system_prompt: str) -> str:
+    """The day's system prompt with the search-signal instruction appended, built once per prompt."""
+    return system_prompt + _SEARCH_SIGNAL_INSTRUCTION
+
+
+def _prompt_cache_key(system_prompt: str) -> str:
+    """Stable key for a static system prompt so OpenAI can route requests to the same prefix cache."""
+    return make_prompt_cache_key(system_prompt, "lg")
+
+
+def _discard_task(task: asyncio.Task) -> None:
+    """Cancel a speculative task and consume its outcome so failures are not reported as unhandled."""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+# Agent serving the graph run in the current task; the compiled graph is shared by all instances.
+_current_agent: ContextVar["LangGraphSearchAgent"] = ContextVar("langgraph_current_agent")
+
+
+def _agent_method(name: str) -> Callable[[GraphState], Awaitable[Any]]:
+    """Graph callback that forwards to the async method ``name`` of the agent bound to the current run."""
+
+    async def call(state: GraphState) -> Any:
+        return await getattr(_current_agent.get(), name)(state)
+
+    call.__name__ = name.lstrip("_")
+    return call
 
 
 class LangGraphSearchAgent:
     """LangGraph-powered conversational search agent with streaming reasoning events."""
 
+    # The topology is static, so it is compiled once per process and shared by every instance.
+    _COMPILED_GRAPH = None
+
     def __init__(
         self,
         *,
@@ -43,14 +208,16 @@ class LangGraphSearchAgent:
         emitter: Optional[Emitter] = None,
     ) -> None:
         self.model = model or _get_default_model()
-        self._client = _get_openai_client()
-        self._graph = self._build_graph()
         self._emitter: Optional[Emitter] = emitter
+        # Scratch state for web_search, reset and reused across search iterations.
+        self._search_state: Optional[States] = None
 
     def set_emitter(self, emitter: Optional[Emitter]) -> None:
         self._emitter = emitter
 
     async def _emit(self, event: str, data: Any) -> None:
+        # Callers with per-request payloads check ``self._emitter`` first so headless runs
+        # skip building them; static events are pre-encoded and passed unconditionally.
         if self._emitter is None:
             return
         try:
@@ -58,20 +225,24 @@ class LangGraphSearchAgent:
         except Exception:
             log.exception("Failed to emit LangGraph event", extra={"event": event})
 
-    def _build_graph(self):
+    @classmethod
+    def _get_compiled_graph(cls):
+        if cls._COMPILED_GRAPH is not None:
+            return cls._COMPILED_GRAPH
+
         graph = StateGraph(GraphState)
 
-        graph.add_node("router", self._router_node)
-        graph.add_node("direct_answer", self._direct_answer_node)
-        graph.add_node("query_refinement", self._query_refinement_node)
-        graph.add_node("search_and_summarize", self._search_and_summarize_node)
-        graph.add_node("final_answer", self._final_answer_node)
+        graph.add_node("router", _agent_method("_router_node"))
+        graph.add_node("direct_answer", _agent_method("_direct_answer_node"))
+        graph.add_node("query_refinement", _agent_method("_query_refinement_node"))
+        graph.add_node("search_and_summarize", _agent_method("_search_and_summarize_node"))
+        graph.add_node("final_answer", _agent_method("_final_answer_node"))
 
         graph.set_entry_point("router")
 
         graph.add_conditional_edges(
             "router",
-            self._route_decision,
+            _agent_method("_route_decision"),
             {
                 "general": "direct_answer",
                 "search": "query_refinement",
@@ -82,7 +253,7 @@ class LangGraphSearchAgent:
 
         graph.add_conditional_edges(
             "search_and_summarize",
-            self._search_loop_condition,
+            _agent_method("_search_loop_condition"),
             {
                 "continue": "query_refinement",
                 "done": "final_answer",
@@ -99,132 +270,224 @@ class LangGraphSearchAgent:
             lambda _: END,
         )
 
-        return graph.compile()
+        cls._COMPILED_GRAPH = graph.compile()
+        return cls._COMPILED_GRAPH
 
-    async def _router_node(self, state: GraphState) -> GraphState:
-        # Router node does not mutate the state – decision happens in _route_decision.
-        await self._emit(
-            "reasoning",
-            {
-                "stage": "router",
-                "message": "요청을 분석하여 검색 필요 여부를 판단합니다.",
-            },
-        )
-        return state
+    async def _router_node(self, state: GraphState) -> StateUpdate:
+        await self._emit("reasoning", _ROUTER_START_EVENT)
 
-    async def _route_decision(self, state: GraphState) -> str:
+        # Obvious cases are decided locally; ambiguous questions are routed by the answer call itself.
         question = state["original_question"]
-        prompt = (
-            "당신은 사용자의 질문을 분석하여 웹 검색이 필요한지 판단합니다.\n"
-            "경미한 인사나 단순 사실 복습이라면 'general'을,\n"
-            "최신 정보나 외부 지식이 필요하면 'search'를 출력하세요.\n"
-            "출력은 general 또는 search 중 하나만 가능하며 다른 단어는 포함하지 마세요."
-        )
+        route = _cheap_route(question) or route_cache.get(self.model, question)
+        if route is None:
+            return await self._answer_or_route(state)
 
-        decision = await self._simple_llm_call(prompt, question)
-        normalized = "search" if "search" in decision.lower() else "general"
-        await self._emit(
-            "reasoning",
-            {
-                "stage": "router",
-                "message": f"판단 결과: { '검색 필요' if normalized == 'search' else '일반 대화' }",
-            },
-        )
-        return normalized
+        await self._emit("reasoning", _ROUTER_RESULT_EVENTS[route])
+        return {"route": route}
 
-    async def _query_refinement_node(self, state: GraphState) -> GraphState:
-        iteration = state["search_iterations"] + 1
-        summaries_text = "\n".join(state["search_results_summary"]) or "없음"
+    async def _answer_or_route(self, state: GraphState) -> StateUpdate:
+        """Stream a direct answer unless the model asks for a search with _SEARCH_SIGNAL.
+
+        Tokens are held back only until they can no longer be the start of the signal,
+        so routing costs no extra LLM round trip.
+        """
+        prompt_messages = [
+            {"role": "system", "content": _routing_system_prompt(self._system_prompt())},
+            *state["messages"],
+        ]
+
+        final_message: Optional[Dict[str, Any]] = None
+        held: List[str] = []
+        answering = False
+        batcher = TokenBatcher(self._emit)
+        try:
+            async with aclosing(
+                call_llm_stream(
+                    messages=prompt_messages,
+                    model=self.model,
+                    temperature=0.2,
+                    prompt_cache_key=_prompt_cache_key(prompt_messages[0]["content"]),
+                )
+            ) as stream:
+                async for chunk in stream:
+                    if not (isinstance(chunk, dict) and chunk.get("event") == "token"):
+                        final_message = chunk
+                        continue
+                    if answering:
+                        await batcher.add(chunk.get("data", ""))
+                        continue
+                    held.append(chunk.get("data", ""))
+                    head = "".join(held)
+                    if _SEARCH_SIGNAL_RE.match(head):
+                        route_cache.set(self.model, state["original_question"], "search")
+                        break
+                    if not _SEARCH_SIGNAL.startswith("".join(head.split()).lstrip(_SIGNAL_NOISE).upper()):
+                        answering = True
+                        await self._emit("reasoning", _ROUTER_RESULT_EVENTS["general"])
+                        await self._emit("reasoning", _DIRECT_ANSWER_EVENT)
+                        await batcher.add("".join(held))
+        finally:
+            await batcher.flush()
+
+        if not answering:
+            # The model asked for a search (or produced nothing but a prefix of the signal).
+            await self._emit("reasoning", _ROUTER_RESULT_EVENTS["search"])
+            return {"route": "search"}
 
-        system_prompt = (
-            "당신은 검색 질의 최적화 도우미입니다. 사용자의 질문과 지금까지의 검색 요약을 참고하여\n"
-            "다음 검색을 위한 가장 유용한 단일 검색어를 만드세요.\n"
-            "가능한 한 구체적으로 작성하며 한국어 사용자에게 적합한 언어를 선택하세요.\n"
-            "출력은 검색어 문장만 포함해야 합니다."
+        if final_message is None:
+            final_message = {"role": "assistant", "content": "".join(held)}
+        return {
+            "route": "general",
+            "messages": [final_message],
+            "final_answer": final_message.get("content", ""),
+        }
+
+    async def _route_decision(self, state: GraphState) -> str:
+        return state.get("route") or "general"
+
+    async def _refine_query(self, state: GraphState, previous: Optional[str] = None) -> str:
+        """``previous`` overrides the accumulated summaries, e.g. with raw snippets not yet summarized."""
+        summaries_text = previous or "\n".join(s for s in state["search_results_summary"] if s) or "없음"
+
+        user_prompt = _REFINE_USER_TEMPLATE.format(
+            question=state["original_question"], summaries=summaries_text
         )
 
-        user_prompt = (
-            f"사용자 질문: {state['original_question']}\n"
-            f"이전 검색 요약: {summaries_text}\n"
-            "다음 검색어를 제안하세요."
+        refined_query = await self._simple_llm_call(
+            _REFINE_SYSTEM_PROMPT, user_prompt, temperature=0.2, max_tokens=REFINEMENT_MAX_TOKENS
         )
+        return refined_query.strip()
 
-        refined_query = await self._simple_llm_call(system_prompt, user_prompt, temperature=0.2)
-        refined_query = refined_query.strip()
+    async def _query_refinement_node(self, state: GraphState) -> StateUpdate:
+        iteration = state["search_iterations"] + 1
 
-        await self._emit(
-            "reasoning",
-            {
-                "stage": "query_refinement",
-                "iteration": iteration,
-                "message": f"검색어 생성 중: {refined_query}",
-                "query": refined_query,
-            },
-        )
+        # Without prior summaries there is nothing to refine with, so the first search uses
+        # the question verbatim; later queries may already be refined by the previous step.
+        if iteration == 1:
+            refined_query = state["original_question"]
+        else:
+            refined_query = state.get("next_search_query") or await self._refine_query(state)
+
+        if self._emitter is not None:
+            await self._emit(
+                "reasoning",
+                {
+                    "stage": "query_refinement",
+                    "iteration": iteration,
+                    "message": f"검색어 생성 중: {refined_query}",
+                    "query": refined_query,
+                },
+            )
 
-        state["current_search_query"] = refined_query
-        return state
+        return {"current_search_query": refined_query, "next_search_query": None}
 
-    async def _search_and_summarize_node(self, state: GraphState) -> GraphState:
+    async def _search_and_summarize_node(self, state: GraphState) -> StateUpdate:
         iteration = state["search_iterations"] + 1
         query = state.get("current_search_query") or state["original_question"]
 
-        await self._emit(
-            "reasoning",
-            {
-                "stage": "search",
-                "iteration": iteration,
-                "message": f"웹 검색 실행: {query}",
-            },
-        )
+        if self._emitter is not None:
+            await self._emit(
+                "reasoning",
+                {
+                    "stage": "search",
+                    "iteration": iteration,
+                    "message": f"웹 검색 실행: {query}",
+                },
+            )
 
-        search_state = States()
-        search_state.tool_state = ToolState()
-        search_results = await web_search(
-            search_state,
-            search_query=[{"q": query, "recency": None, "domains": None}],
-            response_length="long",
-        )
+        async def _search() -> Any:
+            search_state = self._reset_search_state()
+            return await web_search(
+                search_state,
+                search_query=[{"q": query, "recency": None, "domains": None}],
+                response_length="long",
+            )
 
+        search_results = await _single_flight(f"search\x1f{normalize_text(query)}", _search)
+
+        update: StateUpdate = {"search_iterations": iteration}
+        message: Optional[str] = None
         if isinstance(search_results, str):
             summary = f"검색 오류: {search_results}"
         elif not search_results:
             summary = "검색 결과가 없습니다."
+        elif iteration >= MAX_SEARCH_ITERATIONS:
+            # The final answer node condenses everything accumulated so far, so the
+            # last iteration's snippets are handed over as-is instead of being
+            # summarized by a separate LLM call first.
+            summary = f"검색어: {query}\n검색 결과:\n{self._format_snippets(search_results)}"
+            message = f"검색 결과 {min(len(search_results), 5)}건을 최종 답변에 반영합니다."
         else:
-            top_snippets = "\n".join(
-                f"- 제목: {item.get('title','')}\n  요약: {item.get('snippet','')}\n  URL: {item.get('url','')}"
-                for item in search_results[:5]
-            )
+            top_snippets = self._format_snippets(search_results)
 
-            system_prompt = (
-                "당신은 정보를 요약하는 전문가입니다. 아래 검색 결과를 참고하여 핵심 정보를 3-5문장으로 요약하세요.\n"
-                "출처가 있다면 괄호로 표기하고, 중요 사실을 위주로 작성하세요."
+            user_prompt = _SUMMARY_USER_TEMPLATE.format(
+                question=state["original_question"], snippets=top_snippets
             )
-            user_prompt = (
-                f"사용자 질문: {state['original_question']}\n"
-                f"검색 결과:\n{top_snippets}"
+            # Refine the next query from the raw snippets while this iteration is summarized;
+            # it is dropped if the summary turns out to be sufficient.
+            refine_task = asyncio.create_task(self._refine_query(state, previous=top_snippets))
+            try:
+                summary = await self._simple_llm_call(
+                    _SUMMARY_SYSTEM_PROMPT, user_prompt, temperature=0.4, max_tokens=SUMMARY_MAX_TOKENS
+                )
+            except BaseException:
+                _discard_task(refine_task)
+                raise
+            tag = _CONFIDENCE_TAG_RE.search(summary)
+            if tag is not None:
+                update["confident"] = tag.group(1) == "CONFIDENT"
+                summary = _CONFIDENCE_TAG_RE.sub("", summary)
+
+            if update.get("confident"):
+                _discard_task(refine_task)
+            else:
+                try:
+                    update["next_search_query"] = await refine_task
+                except Exception:
+                    log.exception("Speculative query refinement failed")
+
+        summary = summary.strip()
+        state["search_results_summary"][iteration - 1] = summary
+        update["search_results_summary"] = state["search_results_summary"]
+
+        if self._emitter is not None:
+            await self._emit(
+                "reasoning",
+                {
+                    "stage": "summary",
+                    "iteration": iteration,
+                    "message": message or f"웹 검색 결과 요약: {summary}",
+                    "summary": summary,
+                },
             )
-            summary = await self._simple_llm_call(system_prompt, user_prompt, temperature=0.4)
 
-        state["search_iterations"] = iteration
-        state["search_results_summary"].append(summary.strip())
+        return update
 
-        await self._emit(
-            "reasoning",
-            {
-                "stage": "summary",
-                "iteration": iteration,
-                "message": f"웹 검색 결과 요약: {summary.strip()}",
-                "summary": summary.strip(),
-            },
-        )
+    def _reset_search_state(self) -> States:
+        if self._search_state is None:
+            self._search_state = States()
+        self._search_state.reset()
+        return self._search_state
 
-        return state
+    @staticmethod
+    def _format_snippets(search_results: List[Dict[str, Any]]) -> str:
+        items = search_results[:5]
+        for item in items:
+            for key in _SNIPPET_FIELDS:
+                item.setdefault(key, "")
+        render = _SNIPPET_TEMPLATE.format_map
+        return "\n".join([render(item) for item in items])
 
     async def _search_loop_condition(self, state: GraphState) -> str:
-        return "continue" if state["search_iterations"] < 2 else "done"
+        if state["search_iterations"] >= MAX_SEARCH_ITERATIONS or state.get("confident"):
+            return "done"
+        return "continue"
+
+    async def _direct_answer_node(self, state: GraphState) -> StateUpdate:
+        if state.get("final_answer") is not None:
+            # Already answered while routing.
+            return {}
 
-    async def _direct_answer_node(self, state: GraphState) -> GraphState:
         last_messages = state["messages"]
 
         prompt_messages = [
@@ -232,61 +495,44 @@ class LangGraphSearchAgent:
             *last_messages,
         ]
 
-        await self._emit(
-            "reasoning",
-            {
-                "stage": "final",
-                "message": "검색 없이 바로 답변을 생성합니다.",
-            },
-        )
+        await self._emit("reasoning", _DIRECT_ANSWER_EVENT)
 
         final_message = await self._stream_answer(prompt_messages)
-        state["messages"].append(final_message)
-        state["final_answer"] = final_message.get("content", "")
-        return state
+        return {"messages": [final_message], "final_answer": final_message.get("content", "")}
 
-    async def _final_answer_node(self, state: GraphState) -> GraphState:
-        context = "\n\n".join(state["search_results_summary"])
-        user_question = state["original_question"]
+    async def _final_answer_node(self, state: GraphState) -> StateUpdate:
+        context = "\n\n".join(s for s in state["search_results_summary"] if s)
 
         messages = [
-            {
-                "role": "system",
-                "content": (
-                    f"당신은 Perplexity 스타일의 AI 어시스턴트입니다.\n"
-                    f"다음 검색 요약을 참고하여 질문에 답변하세요.\n"
-                    f"필요 시 출처를 간단히 언급하되, 말투는 친절하고 단정하게 유지하세요."
-                ),
-            },
+            {"role": "system", "content": _FINAL_SYSTEM_PROMPT},
             {
                 "role": "user",
-                "content": (
-                    f"질문: {user_question}\n"
-                    f"누적 검색 요약:\n{context}"
-                ),
+                "content": _FINAL_USER_TEMPLATE.format(question=state["original_question"], context=context),
             },
         ]
 
-        await self._emit(
-            "reasoning",
-            {
-                "stage": "final",
-                "message": "검색 결과를 종합하여 최종 답변을 생성합니다.",
-            },
-        )
+        await self._emit("reasoning", _FINAL_ANSWER_EVENT)
 
         final_message = await self._stream_answer(messages)
-        state["messages"].append(final_message)
-        state["final_answer"] = final_message.get("content", "")
-        return state
+        return {"messages": [final_message], "final_answer": final_message.get("content", "")}
 
     async def _stream_answer(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
         final_message: Optional[Dict[str, Any]] = None
-        async for chunk in call_llm_stream(messages=messages, model=self.model, temperature=0.2):
-            if isinstance(chunk, dict) and chunk.get("event") == "token":
-                await self._emit("token", chunk.get("data", ""))
-            else:
-                final_message = chunk
+        # Coalesce streamed tokens into fewer token events (first token is sent immediately).
+        batcher = TokenBatcher(self._emit)
+        try:
+            async for chunk in call_llm_stream(
+                messages=messages,
+                model=self.model,
+                temperature=0.2,
+                prompt_cache_key=_prompt_cache_key(messages[0]["content"]),
+            ):
+                if isinstance(chunk, dict) and chunk.get("event") == "token":
+                    await batcher.add(chunk.get("data", ""))
+                else:
+                    final_message = chunk
+        finally:
+            await batcher.flush()
         if final_message is None:
             final_message = {"role": "assistant", "content": ""}
         return final_message
@@ -296,17 +542,42 @@ class LangGraphSearchAgent:
         system_prompt: str,
         user_prompt: str,
         temperature: float = 0,
+        bypass_cache: bool = False,
+        max_tokens: Optional[int] = None,
     ) -> str:
-        client = self._client
-        response = await client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=temperature,
-        )
-        return response.choices[0].message.content or ""
+        namespace = hashlib.sha1(
+            f"{self.model}\x1f{temperature}\x1f{max_tokens}\x1f{system_prompt}".encode("utf-8")
+        ).hexdigest()
+        if not bypass_cache:
+            cached = llm_cache.get(namespace, user_prompt)
+            if cached is not None:
+                _llm_cache_stats["hits"] += 1
+                log.info("LLM cache hit", extra=dict(_llm_cache_stats))
+                return cached
+            _llm_cache_stats["misses"] += 1
+
+        async def _call() -> str:
+            params: Dict[str, Any] = {}
+            if max_tokens is not None:
+                params["max_tokens"] = max_tokens
+            message = await call_llm_nonstream(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                model=self.model,
+                temperature=temperature,
+                prompt_cache_key=_prompt_cache_key(system_prompt),
+                **params,
+            )
+            content = message["content"]
+            if content and not bypass_cache:
+                llm_cache.set(namespace, user_prompt, content)
+            return content
+
+        if bypass_cache:
+            return await _call()
+        return await _single_flight(f"llm\x1f{namespace}\x1f{user_prompt}", _call)
 
     async def run(
         self,
@@ -321,20 +592,24 @@ class LangGraphSearchAgent:
             ],
             "original_question": question,
             "search_iterations": 0,
-            "search_results_summary": [],
+            "search_results_summary": [None] * MAX_SEARCH_ITERATIONS,
             "current_search_query": None,
+            "next_search_query": None,
             "final_answer": None,
+            "route": None,
+            "confident": False,
         }
 
-        result_state: GraphState = await self._graph.ainvoke(initial_state)
+        token = _current_agent.set(self)
+        try:
+            result_state: GraphState = await self._get_compiled_graph().ainvoke(initial_state)
+        finally:
+            _current_agent.reset(token)
         return result_state
 
     def _system_prompt(self) -> str:
+        # Rendered once per day by app.utils (lru_cache), so no file I/O on the request path.
         try:
-            return (
-                ROOT_DIR
-                / "prompts"
-                / "system.txt"
-            ).read_text(encoding="utf-8")
+            return render_system_prompt(datetime.now().strftime("%Y-%m-%d"), "ko-KR")
         except Exception:
             return "You are a helpful AI assistant."
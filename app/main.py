@@ -1,4 +1,5 @@
 import os
+import sys
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -32,5 +33,7 @@ app.include_router(chat_router, prefix="/api", tags=["chat"])
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "6666"))
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
+    # uvloop은 Windows를 지원하지 않으므로 그 외 플랫폼에서만 사용
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True, loop=loop)
     log.info("FastAPI application initialized")
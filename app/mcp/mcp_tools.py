@@ -1,6 +1,6 @@
-import json
 import os
 import aiohttp
+import orjson
 import requests
 
 from app.utils import States
@@ -82,7 +82,7 @@ def get_mcp_tool(tool_name: str):
                 num_charts = len(states.tool_state.id_to_iframe)
                 states.tool_state.id_to_iframe[f"{num_charts}†chart"] = data[0]
                 if isinstance(tool_input.get('data_json'), str):
-                    data_json = json.loads(tool_input['data_json'])
+                    data_json = orjson.loads(tool_input['data_json'])
                 else:
                     data_json = tool_input['data_json']
                 return f"Chart '{data_json['title']}' has been successfully generated. You can display it to the user by using the following ID: `【{num_charts}†chart】`"                
@@ -1,9 +1,11 @@
+import asyncio
+import atexit
 import sqlite3
 import json
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from app.logger import get_logger
 
 log = get_logger(__name__)
@@ -18,15 +20,43 @@ else:
 
 
 class ChatHistoryStore:
-    """SQLite 기반의 채팅 히스토리 저장소 - LangChain 멀티턴 대화 지원"""
+    """
+    SQLite 기반의 채팅 히스토리 저장소 - LangChain 멀티턴 대화 지원
+
+    쓰기는 메모리 버퍼에 모았다가 `flush_interval`초 뒤 (또는 `batch_size`개가 쌓이면)
+    한 트랜잭션으로 기록합니다(write-behind). 조회 전에는 항상 버퍼를 먼저 기록하므로
+    같은 프로세스 안에서는 방금 저장한 메시지가 바로 보입니다.
+
+    조회 결과는 프로세스에 캐시하지 않습니다. 워커가 여러 개이면 다른 워커의 쓰기로 캐시가
+    낡기 때문에 항상 DB에서 읽습니다. 행은 `(id, role, content)` 튜플로 읽고, 필요한 형태의
+    dict는 호출부에서 만듭니다.
+    """
     
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+    ):
         self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[str, str, str]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_loop: Optional[asyncio.AbstractEventLoop] = None
         # 디렉토리가 없으면 생성
         db_dir = os.path.dirname(self.db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
         self._init_db()
+        # 프로세스 종료 시 남은 버퍼 기록
+        atexit.register(self._flush_pending)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        # WAL 모드에서는 NORMAL로도 충분히 안전하며 커밋마다 fsync 하지 않음
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
     
     def _init_db(self):
         """데이터베이스 초기화"""
@@ -34,6 +64,9 @@ class ChatHistoryStore:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            # 읽기와 쓰기가 서로 막지 않도록 WAL 저널 사용 (DB 파일에 영구 설정됨)
+            cursor.execute("PRAGMA journal_mode=WAL")
+            
             # 채팅 세션 테이블
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS chat_sessions (
@@ -73,8 +106,22 @@ class ChatHistoryStore:
         특정 채팅 세션의 메시지 히스토리 조회
         최근 limit개 메시지만 반환 (기본값: 10개 - 멀티턴 윈도우)
         """
+        return [
+            {"id": _id, "role": role, "content": content}
+            for _id, role, content in self._get_rows(chat_id, limit)
+        ]
+    
+    async def get_llm_messages(self, chat_id: str, limit: int = 10) -> List[dict]:
+        """최근 limit개 메시지를 LLM 입력 형식(`role`, `content`)으로 반환"""
+        return [
+            {"role": role, "content": content}
+            for _, role, content in self._get_rows(chat_id, limit)
+        ]
+    
+    def _get_rows(self, chat_id: str, limit: int) -> List[Tuple[int, str, str]]:
+        self._flush_pending()
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # 총 메시지 수 조회
@@ -85,104 +132,86 @@ class ChatHistoryStore:
             offset = max(0, total_count - limit)
             
             cursor.execute('''
-                SELECT id, role, content, created_at
+                SELECT id, role, content
                 FROM chat_messages
                 WHERE chat_id = ?
                 ORDER BY id ASC
                 LIMIT ? OFFSET ?
             ''', (chat_id, limit, offset))
             
-            messages = []
             rows = cursor.fetchall()
-
-            for row in rows:
-                # row: id, role, content, created_at
-                _id, role, content, created_at = row
-                msg = {
-                    "id": _id,
-                    "role": role,
-                    "content": content
-                }
-                messages.append(msg)
             
             conn.close()
-            return messages
+            return rows
         except Exception as e:
             log.error(f"Failed to get chat history: {e}")
             return []
     
     async def save_message(self, chat_id: str, role: str, content: str) -> bool:
-        """메시지 저장"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 세션 존재 여부 확인, 없으면 생성
-            cursor.execute('SELECT chat_id FROM chat_sessions WHERE chat_id = ?', (chat_id,))
-            if not cursor.fetchone():
-                cursor.execute('''
-                    INSERT INTO chat_sessions (chat_id, created_at, updated_at)
-                    VALUES (?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                ''', (chat_id,))
-            
-            # 메시지 저장
-            cursor.execute('''
-                INSERT INTO chat_messages (chat_id, role, content)
-                VALUES (?, ?, ?)
-            ''', (chat_id, role, content))
-            
-            # 세션 업데이트 시간 갱신
-            cursor.execute('''
-                UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE chat_id = ?
-            ''', (chat_id,))
-            
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            log.error(f"Failed to save message: {e}")
-            return False
+        """메시지 저장 (버퍼에 추가 후 일괄 기록)"""
+        return self._enqueue([(chat_id, role, content)])
     
     async def save_messages(self, chat_id: str, messages: List[dict]) -> bool:
         """여러 메시지 일괄 저장"""
+        return self._enqueue([
+            (chat_id, msg.get('role'), msg.get('content', ''))
+            for msg in messages
+        ])
+    
+    async def flush(self) -> None:
+        """버퍼에 남은 메시지를 즉시 기록"""
+        self._flush_pending()
+    
+    def _enqueue(self, rows: List[Tuple[str, str, str]]) -> bool:
+        self._pending.extend(rows)
+        if len(self._pending) >= self.batch_size:
+            return self._flush_pending()
+        
+        loop = asyncio.get_running_loop()
+        if self._flush_handle is None or self._flush_loop is not loop:
+            self._flush_loop = loop
+            self._flush_handle = loop.call_later(self.flush_interval, self._flush_pending)
+        return True
+    
+    def _flush_pending(self) -> bool:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return True
+        
+        rows, self._pending = self._pending, []
+        chat_ids = [(chat_id,) for chat_id in dict.fromkeys(row[0] for row in rows)]
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 세션 존재 여부 확인, 없으면 생성
-            cursor.execute('SELECT chat_id FROM chat_sessions WHERE chat_id = ?', (chat_id,))
-            if not cursor.fetchone():
-                cursor.execute('''
-                    INSERT INTO chat_sessions (chat_id, created_at, updated_at)
+            conn = self._connect()
+            with conn:
+                # 세션이 없으면 생성
+                conn.executemany('''
+                    INSERT OR IGNORE INTO chat_sessions (chat_id, created_at, updated_at)
                     VALUES (?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                ''', (chat_id,))
-            
-            # 메시지 저장
-            for msg in messages:
-                role = msg.get('role')
-                content = msg.get('content', '')
+                ''', chat_ids)
                 
-                cursor.execute('''
+                # 메시지 저장
+                conn.executemany('''
                     INSERT INTO chat_messages (chat_id, role, content)
                     VALUES (?, ?, ?)
-                ''', (chat_id, role, content))
-            
-            # 세션 업데이트 시간 갱신
-            cursor.execute('''
-                UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE chat_id = ?
-            ''', (chat_id,))
-            
-            conn.commit()
+                ''', rows)
+                
+                # 세션 업데이트 시간 갱신
+                conn.executemany('''
+                    UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE chat_id = ?
+                ''', chat_ids)
             conn.close()
             return True
         except Exception as e:
-            log.error(f"Failed to save messages: {e}")
+            log.error(f"Failed to save messages: {e}", extra={"count": len(rows)})
             return False
     
     async def clear_chat_history(self, chat_id: str) -> bool:
         """채팅 히스토리 삭제"""
+        self._flush_pending()
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('DELETE FROM chat_messages WHERE chat_id = ?', (chat_id,))
@@ -197,8 +226,9 @@ class ChatHistoryStore:
     
     async def get_session_count(self, user_id: Optional[str] = None) -> int:
         """세션 수 조회"""
+        self._flush_pending()
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             if user_id:
@@ -212,3 +242,7 @@ class ChatHistoryStore:
         except Exception as e:
             log.error(f"Failed to get session count: {e}")
             return 0
+
+
+# 쓰기 버퍼를 공유해야 하므로 프로세스당 하나의 인스턴스를 사용
+history_store = ChatHistoryStore()
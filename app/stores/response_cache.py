@@ -0,0 +1,133 @@
+"""
+LLM 응답 캐시
+대소문자/공백만 정규화한 문자열 키로 같은 입력의 이전 응답을 재사용합니다.
+`similarity_threshold`를 지정하면 문자 3-gram 코사인 유사도로 거의 같은 입력도 찾습니다.
+유사도 조회는 부정어/숫자/연산자 하나 차이도 같은 입력으로 볼 수 있으므로, 잘못 재사용돼도
+결과가 틀리지 않는 용도(예: 라우팅 힌트)에만 사용합니다.
+외부 임베딩 모델 없이 프로세스 메모리만 사용합니다.
+"""
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from app.logger import get_logger
+
+log = get_logger(__name__)
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """대소문자와 공백만 정리 (숫자/연산자/문장부호는 의미가 있으므로 유지)"""
+    return _WS_RE.sub(" ", text.casefold()).strip()
+
+
+def _trigram_vector(normalized: str) -> tuple[Counter, float]:
+    padded = f" {normalized} "
+    grams = Counter(padded[i:i + 3] for i in range(max(1, len(padded) - 2)))
+    norm = math.sqrt(sum(v * v for v in grams.values()))
+    return grams, norm
+
+
+def _cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(v * b.get(k, 0) for k, v in a.items())
+    return dot / (a_norm * b_norm)
+
+
+class _Entry:
+    __slots__ = ("value", "vector", "norm", "expires_at")
+
+    def __init__(self, value: str, vector: Optional[Counter], norm: float, expires_at: float):
+        self.value = value
+        self.vector = vector
+        self.norm = norm
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """네임스페이스(사용자/대화 맥락 등)별 LRU + 유사도 응답 캐시"""
+
+    def __init__(
+        self,
+        max_namespaces: int = 1024,
+        max_entries_per_namespace: int = 128,
+        ttl_seconds: float = 3600,
+        similarity_threshold: Optional[float] = None,
+    ):
+        """
+        Args:
+            max_namespaces: 유지할 최대 네임스페이스 수 (초과 시 가장 오래된 것부터 제거)
+            max_entries_per_namespace: 네임스페이스별 최대 항목 수
+            ttl_seconds: 항목 유효 시간 (초)
+            similarity_threshold: 유사도 히트로 인정할 최소 코사인 유사도 (None이면 정확 일치만 사용)
+        """
+        self.max_namespaces = max_namespaces
+        self.max_entries_per_namespace = max_entries_per_namespace
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._namespaces: "OrderedDict[str, OrderedDict[str, _Entry]]" = OrderedDict()
+
+    def get(self, namespace: str, text: str) -> Optional[str]:
+        """캐시된 응답 조회. 정확 일치가 없고 유사도 조회가 켜져 있으면 유사도 기반으로 찾습니다."""
+        entries = self._namespaces.get(namespace)
+        if not entries:
+            return None
+        self._namespaces.move_to_end(namespace)
+
+        now = time.monotonic()
+        key = normalize_text(text)
+        entry = entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                entries.move_to_end(key)
+                return entry.value
+            del entries[key]
+
+        if self.similarity_threshold is None:
+            return None
+
+        vector, norm = _trigram_vector(key)
+        best_key, best_score = None, 0.0
+        for cached_key, cached in list(entries.items()):
+            if cached.expires_at <= now:
+                del entries[cached_key]
+                continue
+            score = _cosine(vector, norm, cached.vector, cached.norm)
+            if score > best_score:
+                best_key, best_score = cached_key, score
+
+        if best_key is not None and best_score >= self.similarity_threshold:
+            entries.move_to_end(best_key)
+            log.debug("response cache similarity hit", extra={"score": round(best_score, 3)})
+            return entries[best_key].value
+        return None
+
+    def set(self, namespace: str, text: str, value: str) -> None:
+        """응답 저장"""
+        entries = self._namespaces.get(namespace)
+        if entries is None:
+            entries = self._namespaces[namespace] = OrderedDict()
+            while len(self._namespaces) > self.max_namespaces:
+                self._namespaces.popitem(last=False)
+        else:
+            self._namespaces.move_to_end(namespace)
+
+        key = normalize_text(text)
+        vector, norm = _trigram_vector(key) if self.similarity_threshold is not None else (None, 0.0)
+        entries[key] = _Entry(value, vector, norm, time.monotonic() + self.ttl_seconds)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries_per_namespace:
+            entries.popitem(last=False)
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        """네임스페이스 하나 또는 전체 캐시 삭제"""
+        if namespace is None:
+            self._namespaces.clear()
+        else:
+            self._namespaces.pop(namespace, None)
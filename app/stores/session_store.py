@@ -1,25 +1,42 @@
+import asyncio
 import os
-import json
 import datetime
 from typing import List, Optional, Any
 
+import orjson
 import redis.asyncio as redis
 
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# 메시지 본문 합계가 이보다 크면 JSON 직렬화를 스레드에서 수행 (이벤트 루프 블로킹 방지)
+# orjson은 수십 KB를 수십 µs에 처리하므로 스레드 전환 비용이 더 큰 작은 대화는 그대로 직렬화
+_OFFLOAD_SERIALIZE_THRESHOLD = 1024 * 1024
+
+
+def _content_size(messages: List[Any]) -> int:
+    """직렬화 크기 추정용: 메시지 content 문자열 길이의 합"""
+    total = 0
+    for msg in messages:
+        content = msg.get("content") if isinstance(msg, dict) else msg
+        if isinstance(content, str):
+            total += len(content)
+    return total
+
 
 class SessionStore:
     def __init__(self) -> None:
         self.client = redis.from_url(REDIS_URL, decode_responses=True)
 
     async def get_messages(self, chat_id: str) -> Optional[List[dict]]:
+        # 여러 워커가 같은 키를 읽고 쓰므로 프로세스 캐시 없이 항상 Redis에서 읽음
+        # (파싱된 리스트는 매번 새로 만들어지므로 호출자가 그대로 수정해도 됨)
         raw = await self.client.get(f"chat:{chat_id}")
         if not raw:
             return None
         try:
-            payload = json.loads(raw)
-        except json.JSONDecodeError:
+            payload = orjson.loads(raw)
+        except orjson.JSONDecodeError:
             return None
         return payload.get("messages", None)
 
@@ -28,8 +45,12 @@ class SessionStore:
             "messages": messages,
             "updatedAt": datetime.datetime.utcnow().isoformat() + "Z",
         }
-        data = json.dumps(payload, ensure_ascii=False)
+        if _content_size(messages) > _OFFLOAD_SERIALIZE_THRESHOLD:
+            data = await asyncio.to_thread(orjson.dumps, payload)
+        else:
+            data = orjson.dumps(payload)
+        key = f"chat:{chat_id}"
         if ttl_seconds:
-            await self.client.setex(f"chat:{chat_id}", ttl_seconds, data)
+            await self.client.setex(key, ttl_seconds, data)
         else:
-            await self.client.set(f"chat:{chat_id}", data)
+            await self.client.set(key, data)
@@ -1,3 +1,6 @@
+import asyncio
+import functools
+
 from .bio import bio, BIO
 from .web_search import web_search, WEB_SEARCH
 from .open_url import open, OPEN_URL
@@ -9,20 +12,41 @@ except Exception:
         return {}
 
 
+# 툴 구성은 프로세스 동안 바뀌지 않으므로 한 번만 만들어 재사용
+_TOOLS_FOR_LLM = [
+    WEB_SEARCH,
+    OPEN_URL,
+    BIO,
+    *MCP_TOOLS
+]
+_tool_map = None
+
+
+def _ensure_async(func):
+    """동기 툴은 스레드에서 실행하는 코루틴 함수로 감싸 호출부가 항상 await만 하도록 함"""
+    if asyncio.iscoroutinefunction(func):
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(states, **tool_input):
+        return await asyncio.to_thread(func, states, **tool_input)
+
+    return wrapper
+
+
 async def get_tool_map():
-    mcp_map = await get_mcp_tool_map()
-    return {
-        "search": web_search,
-        "open": open,
-        "bio": bio,
-        **mcp_map,
-    }
+    global _tool_map
+    if _tool_map is None:
+        mcp_map = await get_mcp_tool_map()
+        tool_map = {
+            "search": web_search,
+            "open": open,
+            "bio": bio,
+            **mcp_map,
+        }
+        _tool_map = {name: _ensure_async(func) for name, func in tool_map.items()}
+    return _tool_map
 
 
 async def get_tools_for_llm():
-    return [
-        WEB_SEARCH,
-        OPEN_URL,
-        BIO,
-        *MCP_TOOLS
-    ]
+    return _TOOLS_FOR_LLM
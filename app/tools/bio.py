@@ -1,3 +1,5 @@
+import asyncio
+import weakref
 from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import Literal
@@ -6,6 +8,15 @@ from app.utils import States
 from app.stores.session_store import SessionStore
 
 store = SessionStore()
+# 같은 턴의 bio 호출은 동시에 실행되므로, 사용자별 락으로 읽기-수정-쓰기를 직렬화해 갱신 유실 방지
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _user_lock(user_id: str) -> asyncio.Lock:
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
 
 class BioModel(BaseModel):
     mode: Literal["w", "d"] = Field(description="'w' for write or 'd' for delete")
@@ -36,18 +47,19 @@ async def bio(
     if not states.user_id:
         return "User ID is not set. It is no use to use this tool."
     
-    msc_list = (await store.get_messages(states.user_id)) or []
+    async with _user_lock(states.user_id):
+        msc_list = (await store.get_messages(states.user_id)) or []
 
-    if tool_input.mode == "w":
-        if tool_input.content is None:
-            return "You chose to write a memory item, but you didn't fill the content field. Please fill the content field."
+        if tool_input.mode == "w":
+            if tool_input.content is None:
+                return "You chose to write a memory item, but you didn't fill the content field. Please fill the content field."
+            
+            msc_list.append(f"[{datetime.now().strftime('%Y-%m-%d')}]. {tool_input.content}")
+        else:
+            if tool_input.id is None:
+                return "You chose to delete a memory item, but you didn't fill the id field. Please fill the id field."
+            msc_list.pop(tool_input.id - 1)
         
-        msc_list.append(f"[{datetime.now().strftime('%Y-%m-%d')}]. {tool_input.content}")
-    else:
-        if tool_input.id is None:
-            return "You chose to delete a memory item, but you didn't fill the id field. Please fill the id field."
-        msc_list.pop(tool_input.id - 1)
-    
-    await store.save_messages(states.user_id, msc_list)
+        await store.save_messages(states.user_id, msc_list)
 
     return f"Model set context updated."
@@ -30,8 +30,11 @@ HTML_SUP_RE = re.compile(r"<sup( [^>]*)?>([\w\-]+)</sup>")
 HTML_SUB_RE = re.compile(r"<sub( [^>]*)?>([\w\-]+)</sub>")
 HTML_TAGS_SEQ_RE = re.compile(r"(?<=\w)((<[^>]*>)+)(?=\w)")
 WHITESPACE_ANCHOR_RE = re.compile(r"(【\@[^】]+】)(\s+)")
+IMAGE_ANCHOR_RE = re.compile(r"【\@([^】]+)】")
 EMPTY_LINE_RE = re.compile(r"^\s+$", flags=re.MULTILINE)
 EXTRA_NEWLINE_RE = re.compile(r"\n(\s*\n)+")
+WHITESPACE_RE = re.compile(r"\s+")
+ARXIV_RE = re.compile(r"arxiv.org")
 
 
 async def open(
@@ -41,7 +44,7 @@ async def open(
     def is_url(url: str) -> bool:
         return url.startswith("http")
     
-    def make_response(page_contents: PageContents, loc: int, num_lines: int) -> str:
+    def make_response(page_contents: PageContents, loc: int, num_lines: int, turn: int) -> str:
         lines = page_contents.text.splitlines()
         if not lines:
             return ""
@@ -53,7 +56,7 @@ async def open(
         domain = urlparse(page_contents.url).netloc
         body = "\n".join(lines_to_show)
         header = (
-            f"# 【{states.turn}:0†{page_contents.title}†{domain}】\n"
+            f"# 【{turn}:0†{page_contents.title}†{domain}】\n"
             f"**viewing lines [{start} - {end-1}] of {len(lines)}**"
         )
 
@@ -73,7 +76,7 @@ async def open(
         curr_url = getattr(states.tool_state, "current_url", None)
         if curr_url and curr_url in states.tool_state.url_to_page:
             page = states.tool_state.url_to_page[curr_url]
-            return make_response(page, tool_input.loc, tool_input.num_lines)
+            return make_response(page, tool_input.loc, tool_input.num_lines, states.turn)
         else:
             return "There is no opened page. Please provide a link `id` or a direct URL."
     # 3) 링크 ID 열기
@@ -83,20 +86,22 @@ async def open(
             return f"Unknown link ID: {tool_input.id}. Please provide a link `id` or a direct URL."
         url = link_url
     
+    # 다른 툴과 동시에 실행될 수 있으므로 await 전에 turn 번호를 먼저 예약
+    turn = states.turn
+    states.turn += 1
+
     # 페이지 열고 상태 갱신
     try:
-        page_contents = await open_url(url, states.turn)
+        page_contents = await open_url(url, turn)
     except Exception as e:
         return f"Failed to open page: {e}"
     
     states.tool_state.url_to_page[url] = page_contents
     states.tool_state.current_url = url
-    states.tool_state.id_to_url[f"{states.turn}:0"] = url
+    states.tool_state.id_to_url[f"{turn}:0"] = url
     for link_id, link_target in page_contents.urls.items():
-        states.tool_state.id_to_url[f"{states.turn}:{link_id}"] = link_target
-    response = make_response(page_contents, tool_input.loc, tool_input.num_lines)
-    states.turn += 1
-    return response
+        states.tool_state.id_to_url[f"{turn}:{link_id}"] = link_target
+    return make_response(page_contents, tool_input.loc, tool_input.num_lines, turn)
 
 
 class PageContents(BaseModel):
@@ -166,13 +171,13 @@ async def open_url(
     def merge_whitespace(text: str) -> str:
         """Replace newlines with spaces and merge consecutive whitespace into a single space."""
         text = text.replace("\n", " ")
-        text = re.sub(r"\s+", " ", text)
+        text = WHITESPACE_RE.sub(" ", text)
         return text
 
 
     def arxiv_to_ar5iv(url: str) -> str:
         """Converts an arxiv.org URL to its ar5iv.org equivalent."""
-        return re.sub(r"arxiv.org", r"ar5iv.org", url)
+        return ARXIV_RE.sub("ar5iv.org", url)
 
 
     def _clean_links(root: lxml.html.HtmlElement, cur_url: str, turn: int) -> dict[str, str]:
@@ -186,7 +191,7 @@ async def open_url(
             if link.startswith(("mailto:", "javascript:")):
                 continue
             text = _get_text(a).replace("†", "‡")
-            if not re.sub(r"【\@([^】]+)】", "", text):  # Probably an image
+            if not IMAGE_ANCHOR_RE.sub("", text):  # Probably an image
                 continue
             if link.startswith("#"):
                 replace_node_with_text(a, text)
@@ -226,10 +231,10 @@ async def open_url(
 
     def html_to_text(html: str) -> str:
         """Converts an HTML string to clean plaintext."""
-        html = re.sub(HTML_SUP_RE, r"^{\2}", html)
-        html = re.sub(HTML_SUB_RE, r"_{\2}", html)
+        html = HTML_SUP_RE.sub(r"^{\2}", html)
+        html = HTML_SUB_RE.sub(r"_{\2}", html)
         # add spaces between tags such as table cells
-        html = re.sub(HTML_TAGS_SEQ_RE, r" \1", html)
+        html = HTML_TAGS_SEQ_RE.sub(r" \1", html)
         # we don't need to escape markdown, so monkey-patch the logic
         orig_escape_md = html2text.utils.escape_md
         orig_escape_md_section = html2text.utils.escape_md_section
@@ -368,12 +373,12 @@ async def open_url(
         _remove_math(root)
         clean_html = lxml.etree.tostring(root, encoding="UTF-8").decode()
         text = html_to_text(clean_html)
-        text = re.sub(WHITESPACE_ANCHOR_RE, lambda m: m.group(2) + m.group(1), text)
+        text = WHITESPACE_ANCHOR_RE.sub(lambda m: m.group(2) + m.group(1), text)
         # ^^^ move anchors to the right thru whitespace
         # This way anchors don't create extra whitespace
-        text = re.sub(EMPTY_LINE_RE, "", text)
+        text = EMPTY_LINE_RE.sub("", text)
         # ^^^ Get rid of empty lines
-        text = re.sub(EXTRA_NEWLINE_RE, "\n\n", text)
+        text = EXTRA_NEWLINE_RE.sub("\n\n", text)
         # ^^^ Get rid of extra newlines
 
         return PageContents(
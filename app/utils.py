@@ -1,7 +1,12 @@
+import asyncio
+import functools
+import hashlib
 import os
 import pathlib
 import json
-from typing import Any
+from typing import Any, Awaitable, Callable
+import httpx
+import orjson
 from pydantic import BaseModel, Field
 from openai import AsyncOpenAI
 
@@ -12,6 +17,18 @@ log = get_logger(__name__)
 ROOT_DIR = pathlib.Path(__file__).parent.absolute()
 
 
+@functools.lru_cache(maxsize=1)
+def load_system_prompt_template() -> str:
+    """prompts/system.txt 원문을 한 번만 읽어 캐시합니다."""
+    return (ROOT_DIR / "prompts" / "system.txt").read_text(encoding="utf-8")
+
+
+@functools.lru_cache(maxsize=8)
+def render_system_prompt(current_date: str, locale: str = "ko-KR") -> str:
+    """날짜/로케일이 채워진 시스템 프롬프트. 같은 날짜의 요청은 동일한 문자열을 재사용합니다."""
+    return load_system_prompt_template().format(current_date=current_date, locale=locale)
+
+
 class ToolState(BaseModel):
     id_to_url: dict[str, str] = Field(default_factory=dict)
     url_to_page: dict[str, object] = Field(default_factory=dict)
@@ -19,6 +36,14 @@ class ToolState(BaseModel):
     tool_results: dict[str, object] = Field(default_factory=dict)
     id_to_iframe: dict[str, str] = Field(default_factory=dict)
 
+    def reset(self) -> None:
+        """재사용을 위해 내용을 비웁니다 (dict 객체는 그대로 유지)."""
+        self.id_to_url.clear()
+        self.url_to_page.clear()
+        self.current_url = None
+        self.tool_results.clear()
+        self.id_to_iframe.clear()
+
 
 class States:
     user_id: str = None
@@ -26,17 +51,126 @@ class States:
     turn: int = 0
     tools: list[dict] = []
     tool_state: ToolState = ToolState()
+    # 마지막으로 emit한 tool_state JSON의 해시 (변경이 없으면 다시 보내지 않음)
+    tool_state_hash: int | None = None
     tool_results: dict[str, object] = {}
 
+    def reset(self) -> None:
+        """
+        같은 객체를 다음 호출에 재사용할 수 있도록 요청별 상태를 초기화합니다.
+        tool_state는 이 인스턴스 전용 객체로 두고 내용만 비웁니다.
+        """
+        self.user_id = None
+        self.messages = []
+        self.turn = 0
+        self.tools = []
+        if "tool_state" in self.__dict__:
+            self.tool_state.reset()
+        else:
+            self.tool_state = ToolState()
+        self.tool_state_hash = None
+        self.tool_results = {}
+
+
+class TokenBatcher:
+    """
+    스트리밍 토큰을 모아서 하나의 token 이벤트로 emit 합니다.
+    첫 토큰은 체감 지연을 줄이기 위해 즉시 내보내고, 이후에는 `batch_size`개가 모이거나
+    마지막 flush 이후 `flush_interval`초가 지나면 합쳐서 내보냅니다.
+    스트림이 끝나면 반드시 `flush()`를 호출해야 합니다.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, Any], Awaitable[None]],
+        batch_size: int = 32,
+        flush_interval: float = 0.01,
+    ):
+        self._emit = emit
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._buf: list[str] = []
+        self._started = False
+        self._last_flush = 0.0
+
+    async def add(self, token: str) -> None:
+        if not token:
+            return
+        now = asyncio.get_running_loop().time()
+        if not self._started:
+            self._started = True
+            self._last_flush = now
+            await self._emit("token", token)
+            return
+        self._buf.append(token)
+        if len(self._buf) >= self._batch_size or now - self._last_flush >= self._flush_interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buf:
+            return
+        data = "".join(self._buf)
+        self._buf.clear()
+        self._last_flush = asyncio.get_running_loop().time()
+        await self._emit("token", data)
+
 
+@functools.lru_cache(maxsize=256)
+def _loads_tool_arguments(arguments: str) -> Any:
+    return orjson.loads(arguments)
+
+
+def parse_tool_arguments(arguments: str | None) -> Any:
+    """
+    tool_call.function.arguments(JSON 문자열)를 파싱합니다.
+    같은 인자 문자열은 캐시된 결과를 재사용하며, 호출자가 수정해도 캐시가 오염되지 않도록 dict는 복사해서 반환합니다.
+    잘못된 JSON이면 orjson.JSONDecodeError(json.JSONDecodeError의 하위 클래스)를 발생시킵니다.
+    """
+    if not arguments:
+        return {}
+    parsed = _loads_tool_arguments(arguments)
+    return dict(parsed) if isinstance(parsed, dict) else parsed
+
+
+@functools.lru_cache(maxsize=1)
 def _get_openai_client() -> AsyncOpenAI:
+    """
+    프로세스 전체에서 공유하는 AsyncOpenAI 클라이언트.
+    요청마다 커넥션 풀/TLS 세션을 새로 만들지 않고 keep-alive 연결을 재사용합니다.
+    """
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY 환경 변수가 설정되지 않았습니다.")
-    return AsyncOpenAI(api_key=api_key)
+    return AsyncOpenAI(
+        api_key=api_key,
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        ),
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """
+    프로세스 전체에서 동시에 진행되는 LLM 호출 수 상한 (LLM_MAX_CONCURRENCY, 기본 16).
+    요청이 몰려도 공급자 rate limit(429)과 그로 인한 재시도 지연을 피하고, 초과분은 대기합니다.
+    """
+    return asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "16")))
 
 
+@functools.lru_cache(maxsize=64)
+def make_prompt_cache_key(system_prompt: str, namespace: str) -> str:
+    """
+    정적인 시스템 프롬프트용 `prompt_cache_key` ("{namespace}-{sha1 앞 16자}").
+    같은 prefix의 요청이 OpenAI의 같은 prompt cache로 라우팅되어 prefill을 재사용합니다.
+    """
+    return f"{namespace}-" + hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=1)
 def _get_default_model() -> str:
+    """OPENAI_MODEL 환경 변수는 프로세스 시작 시 정해지므로 한 번만 읽습니다."""
     return os.getenv("OPENAI_MODEL", "gpt-4o")
 
 
@@ -45,11 +179,13 @@ async def call_llm_stream(
     model: str | None = None,
     tools: list[dict] | None = None,
     temperature: float | None = None,
+    prompt_cache_key: str | None = None,
     **kwargs
 ):
     """
     OpenAI API를 사용하여 스트리밍 호출합니다.
     OpenAI Chat Completions 스트림을 파싱하여 토큰/툴콜을 동일 포맷으로 내보냅니다.
+    `prompt_cache_key`를 주면 같은 프롬프트 prefix를 가진 요청이 같은 서버의 prompt cache를 타도록 힌트를 보냅니다.
     """
     client = _get_openai_client()
     model = model or _get_default_model()
@@ -87,106 +223,141 @@ async def call_llm_stream(
     if temperature is not None:
         stream_params["temperature"] = temperature
 
+    if prompt_cache_key:
+        # 구버전 SDK에서도 동작하도록 extra_body로 전달
+        stream_params["extra_body"] = {"prompt_cache_key": prompt_cache_key}
+
     full_content_parts: list[str] = []
     tool_call_buf: dict[int, dict] = {}
     
-    try:
-        stream = await client.chat.completions.create(**stream_params)
+    # 동시 LLM 호출 수를 제한하고, 스트림을 끝까지 소비할 때까지 슬롯을 유지
+    async with _get_llm_semaphore():
+        try:
+            stream = await client.chat.completions.create(**stream_params)
         
-        async for chunk in stream:
-            if not chunk.choices:
-                continue
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
                 
-            choice = chunk.choices[0]
-            delta = choice.delta
+                choice = chunk.choices[0]
+                delta = choice.delta
             
-            if not delta:
-                continue
+                if not delta:
+                    continue
             
-            # tool calls 처리
-            if delta.tool_calls:
-                for tool_call in delta.tool_calls:
-                    if tool_call.index is not None:
-                        idx = tool_call.index
-                        if idx not in tool_call_buf:
-                            tool_call_buf[idx] = {
-                                "id": tool_call.id or "",
-                                "type": "function",
-                                "function": {
-                                    "name": "",
-                                    "arguments": "",
-                                },
-                            }
-                        buf = tool_call_buf[idx]
+                # tool calls 처리
+                if delta.tool_calls:
+                    for tool_call in delta.tool_calls:
+                        if tool_call.index is not None:
+                            idx = tool_call.index
+                            if idx not in tool_call_buf:
+                                tool_call_buf[idx] = {
+                                    "id": tool_call.id or "",
+                                    "type": "function",
+                                    "function": {
+                                        "name": "",
+                                        "arguments": "",
+                                    },
+                                }
+                            buf = tool_call_buf[idx]
                         
-                        if tool_call.id:
-                            buf["id"] = tool_call.id
+                            if tool_call.id:
+                                buf["id"] = tool_call.id
                         
-                        if tool_call.function:
-                            if tool_call.function.name:
-                                buf["function"]["name"] = tool_call.function.name
-                            if tool_call.function.arguments:
-                                buf["function"]["arguments"] += tool_call.function.arguments
+                            if tool_call.function:
+                                if tool_call.function.name:
+                                    buf["function"]["name"] = tool_call.function.name
+                                if tool_call.function.arguments:
+                                    buf["function"]["arguments"] += tool_call.function.arguments
             
-            # content tokens 처리
-            # tool_calls가 있는 경우에도 content가 올 수 있음 (예: o1 모델)
-            if delta.content:
-                content_piece = delta.content
-                if content_piece:
-                    full_content_parts.append(content_piece)
-                    # tool_calls가 있으면 토큰을 yield하지 않고 버퍼에만 저장
-                    # tool_calls가 없으면 토큰을 즉시 yield
-                    if not delta.tool_calls:
-                        yield {
-                            "event": "token",
-                            "data": content_piece,
-                        }
+                # content tokens 처리
+                # tool_calls가 있는 경우에도 content가 올 수 있음 (예: o1 모델)
+                if delta.content:
+                    content_piece = delta.content
+                    if content_piece:
+                        full_content_parts.append(content_piece)
+                        # tool_calls가 있으면 토큰을 yield하지 않고 버퍼에만 저장
+                        # tool_calls가 없으면 토큰을 즉시 yield
+                        if not delta.tool_calls:
+                            yield {
+                                "event": "token",
+                                "data": content_piece,
+                            }
         
-        # 최종 메시지 생성
-        final_message: dict[str, Any] = {"role": "assistant"}
-        final_content = "".join(full_content_parts).strip()
-        final_message["content"] = final_content if final_content else ""
+            # 최종 메시지 생성
+            final_message: dict[str, Any] = {"role": "assistant"}
+            final_content = "".join(full_content_parts).strip()
+            final_message["content"] = final_content if final_content else ""
         
-        # tool_calls가 있으면 추가
-        if tool_call_buf:
-            tool_calls = []
-            for idx in sorted(tool_call_buf.keys()):
-                tc = tool_call_buf[idx]
-                # arguments가 JSON 문자열인지 확인
-                try:
-                    # 이미 JSON 문자열이면 그대로 사용
-                    json.loads(tc["function"]["arguments"])
-                    args_str = tc["function"]["arguments"]
-                except (json.JSONDecodeError, TypeError):
-                    # JSON이 아니면 빈 객체로 처리
-                    args_str = "{}"
+            # tool_calls가 있으면 추가
+            if tool_call_buf:
+                tool_calls = []
+                for idx in sorted(tool_call_buf.keys()):
+                    tc = tool_call_buf[idx]
+                    # arguments가 JSON 문자열인지 확인
+                    try:
+                        # 이미 JSON 문자열이면 그대로 사용 (파싱 결과는 캐시되어 툴 실행 시 재사용됨)
+                        # 빈 문자열은 parse_tool_arguments가 {}로 받아 주지만 그대로 되돌려 보내면
+                        # 다음 요청의 tool_calls에 유효하지 않은 JSON이 들어가므로 "{}"로 바꿈
+                        args_str = tc["function"]["arguments"] or "{}"
+                        parse_tool_arguments(args_str)
+                    except (json.JSONDecodeError, TypeError):
+                        # JSON이 아니면 빈 객체로 처리
+                        args_str = "{}"
                 
-                tool_calls.append({
-                    "id": tc["id"],
-                    "type": tc["type"],
-                    "function": {
-                        "name": tc["function"]["name"],
-                        "arguments": args_str,
-                    },
-                })
-            final_message["tool_calls"] = tool_calls
+                    tool_calls.append({
+                        "id": tc["id"],
+                        "type": tc["type"],
+                        "function": {
+                            "name": tc["function"]["name"],
+                            "arguments": args_str,
+                        },
+                    })
+                final_message["tool_calls"] = tool_calls
         
-        yield final_message
+            yield final_message
         
-    except Exception as e:
-        log.exception("OpenAI API 호출 실패")
-        raise
+        except Exception as e:
+            log.exception("OpenAI API 호출 실패")
+            raise
 
 
-def is_sse(response):
-    class SSE(BaseModel):
-        event: str
-        data: Any
+async def call_llm_nonstream(
+    messages: list[dict],
+    model: str | None = None,
+    temperature: float | None = None,
+    prompt_cache_key: str | None = None,
+    **kwargs
+) -> dict[str, Any]:
+    """
+    스트리밍 없이 한 번에 응답을 받습니다. 분류/검색어 정제/요약처럼 최종 텍스트만 필요한 짧은 호출용.
+    토큰별 청크 파싱과 이벤트 루프 wake-up이 없으며, 반환값은 `{"role": "assistant", "content": ...}` 입니다.
+    """
+    client = _get_openai_client()
+    params: dict[str, Any] = {
+        "model": model or _get_default_model(),
+        "messages": messages,
+        **kwargs,
+    }
+    if temperature is not None:
+        params["temperature"] = temperature
+    if prompt_cache_key:
+        params["extra_body"] = {"prompt_cache_key": prompt_cache_key}
 
     try:
-        SSE.model_validate(response)
-        return True
+        async with _get_llm_semaphore():
+            response = await client.chat.completions.create(**params)
     except Exception:
-        return False
+        log.exception("OpenAI API 호출 실패")
+        raise
+    return {"role": "assistant", "content": response.choices[0].message.content or ""}
+
+
+def is_sse(response) -> bool:
+    """
+    call_llm_stream이 내보내는 `{"event": str, "data": ...}` 이벤트인지 판별합니다 (최종 메시지는 False).
+    토큰마다 호출되므로 pydantic 모델 검증 대신 dict 키만 확인합니다.
+    """
+    return isinstance(response, dict) and isinstance(response.get("event"), str) and "data" in response
 
 